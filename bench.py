@@ -0,0 +1,289 @@
+"""Бенчмарки бота на синтетичній базі.
+
+    python bench.py --rows 10000 100000 --queries 500 --out bench.json
+
+Для кожного розміру генерується xlsx із реалістичними артикулами VAG, після чого
+вимірюються холодне завантаження, затримка пошуку (перцентилі), пам'ять кешу результатів
+та вартість пагінації. Результат — JSON, щоб порівнювати між комітами.
+"""
+import os
+import sys
+import json
+import time
+import types
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+
+import numpy as np
+import openpyxl
+
+# Бот не повинен чіпати робочий журнал запитів і читати справжню базу двічі
+os.environ.setdefault("QUERY_LOG_DB", os.path.join(tempfile.gettempdir(), "bench-queries.sqlite3"))
+
+import bot
+
+PREFIXES = ["1K0", "1K8", "2Q0", "3C0", "3G0", "3Q0", "4G0", "4K0", "4M0", "5G0", "5Q0", "5WA", "80A", "8K0", "8V0", "8W0"]
+GROUPS = ["035", "907", "909", "919", "920", "937", "959", "980"]
+# У номерах VAG немає літер I та O
+SUFFIX_LETTERS = list("ABCDEFGHJKLMNPQRSTUVWXYZ")
+MODELS = ["A3-S3", "A4-S4", "A6-S6", "Q3", "Q5", "Q7", "Golf7", "Golf8", "Passat B8", "Tiguan", "Touran",
+          "Octavia A7", "Superb 3", "Kodiaq", "Leon 3", "Ateca", "Polo", "T-Roc", "Arteon", "Karoq"]
+REGIONS = ["EU", "NAR", "RoW", "CN", "JP", "KR", ""]
+UNITS = ["01", "03", "09", "17", "19", "3C", "44", "4B", "5F", "6C", "A5", "13"]
+
+def make_article(rng) -> str:
+    suffix = "".join(rng.choice(SUFFIX_LETTERS, size=rng.integers(0, 3)))
+    return f"{rng.choice(PREFIXES)}{rng.choice(GROUPS)}{rng.integers(0, 1000):03d}{suffix}"
+
+def generate_workbook(path: str, rows: int, seed: int = 0):
+    """Пише синтетичну базу у форматі all-in-one.xlsx (write-only, без тримання в пам'яті)"""
+    rng = np.random.default_rng(seed)
+    # Як і в справжній базі, артикул повторюється для кількох датасетів
+    articles = [make_article(rng) for _ in range(max(rows // 6, 1))]
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    ws.append(["Model", "Article", "Version", "Dataset", "Year", "Region", "Unit"])
+    for _ in range(rows):
+        dataset = f"{rng.choice(PREFIXES)}909{rng.integers(0, 1000):03d}{rng.choice(SUFFIX_LETTERS)}"
+        ws.append([
+            str(rng.choice(MODELS)),
+            articles[rng.integers(0, len(articles))],
+            f"{rng.integers(0, 10000):04d}",
+            dataset,
+            int(rng.integers(2005, 2025)) if rng.random() > 0.05 else None,
+            str(rng.choice(REGIONS)) or None,
+            str(rng.choice(UNITS)),
+        ])
+    wb.save(path)
+
+class FakeMessage:
+    """Замінник telegram.Message: запам'ятовує відповіді замість надсилання"""
+
+    def __init__(self, text=None, chat_id=1):
+        self.text = text
+        self.chat_id = chat_id
+        self.sent = []
+
+    async def reply_text(self, text, **kwargs):
+        self.sent.append(text)
+        return self
+
+    async def edit_text(self, text, **kwargs):
+        self.sent.append(text)
+        return self
+
+class FakeCallbackQuery:
+    def __init__(self, data, message):
+        self.data = data
+        self.message = message
+        self.from_user = types.SimpleNamespace(id=message.chat_id)
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+class FakeBot:
+    async def send_document(self, **kwargs):
+        pass
+
+    async def send_message(self, chat_id, text, **kwargs):
+        pass
+
+class FakeContext:
+    """Замінник ContextTypes.DEFAULT_TYPE із власним user_data"""
+
+    def __init__(self):
+        self.user_data = {}
+        self.bot_data = {}
+        self.args = []
+        self.bot = FakeBot()
+
+def fake_update(text=None, data=None, user_id=1):
+    message = FakeMessage(text, chat_id=user_id)
+    return types.SimpleNamespace(
+        message=message if data is None else None,
+        callback_query=FakeCallbackQuery(data, message) if data is not None else None,
+        inline_query=None,
+        effective_message=message,
+        effective_user=types.SimpleNamespace(id=user_id),
+        effective_chat=types.SimpleNamespace(id=user_id),
+    )
+
+def percentiles(samples: list) -> dict:
+    values = np.array(samples) * 1000
+    return {
+        "count": len(samples),
+        "p50_ms": round(float(np.percentile(values, 50)), 4),
+        "p90_ms": round(float(np.percentile(values, 90)), 4),
+        "p99_ms": round(float(np.percentile(values, 99)), 4),
+        "max_ms": round(float(values.max()), 4),
+    }
+
+def make_queries(snapshot, count: int, seed: int = 1) -> dict:
+    """Набори запитів, схожих на справжні: точні артикули, префікси, з роздільниками, датасети, промахи"""
+    rng = np.random.default_rng(seed)
+    articles = snapshot.table["Article"].dropna().to_numpy()
+    datasets = snapshot.table["Dataset"].dropna().to_numpy()
+    pick = lambda values: [str(v) for v in rng.choice(values, size=count)]
+    return {
+        "article": pick(articles),
+        "article_prefix": [a[:6] for a in pick(articles)],
+        "article_spaced": [f"{a[:3]} {a[3:6]} {a[6:]}".lower() for a in pick(articles)],
+        "dataset": pick(datasets),
+        "miss": [a[:-1] + "Z" + a[-1] for a in pick(articles)],
+    }
+
+async def time_handler(handler, update, context) -> float:
+    start = time.perf_counter()
+    await handler(update, context)
+    return time.perf_counter() - start
+
+def clear_caches():
+    bot.SEARCH_CACHE.clear()
+    bot.PAGE_CACHE.clear()
+    bot.INLINE_CACHE.clear()
+
+async def bench_queries(queries: dict) -> dict:
+    result = {}
+    for kind, texts in queries.items():
+        context = FakeContext()
+        cold = []
+        for text in texts:
+            clear_caches()
+            cold.append(await time_handler(bot.search_database, fake_update(text), context))
+        warm = [await time_handler(bot.search_database, fake_update(text), context) for text in texts]
+        result[kind] = {"cold": percentiles(cold), "warm": percentiles(warm)}
+    return result
+
+async def bench_pagination(snapshot, pages: int) -> dict:
+    """Перегортання сторінок найширшого запиту вперед, без кешу сторінок і з ним"""
+    prefix = snapshot.table["ArticleKey"].str[:3].value_counts().index[0]
+    context = FakeContext()
+    await bot.search_database(fake_update(prefix), context)
+    key, rows = bot.find_rows(snapshot, prefix)
+    total = len(rows)
+    pages = max(1, min(pages, (total + 4) // 5))
+    # Ті самі токени, що й у кнопках "Далі"
+    tokens = [bot.results_token("p", snapshot, bot.token_query(key[1]), (), page) for page in range(pages)]
+    cold = []
+    for token in tokens:
+        bot.PAGE_CACHE.clear()
+        cold.append(await time_handler(bot.button, fake_update(data=token), context))
+    warm = [await time_handler(bot.button, fake_update(data=token), context) for token in tokens]
+    return {"query": prefix, "results": total, "cold": percentiles(cold), "warm": percentiles(warm)}
+
+async def bench_result_cache(snapshot, queries: int) -> dict:
+    """Скільки пам'яті займають закешовані результати й перша сторінка одного широкого запиту.
+    Сесій на користувача більше немає — стан видачі тримають лише спільні кеші"""
+    keys = snapshot.table["ArticleKey"].dropna().str[:4].value_counts()
+    texts = keys.index[:min(queries, bot.CACHE_SIZE)].tolist()
+    clear_caches()
+    context = FakeContext()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for user_id, text in enumerate(texts):
+        await bot.search_database(fake_update(text, user_id=user_id), context)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    grown = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return {
+        "queries": len(texts),
+        "results_per_query": round(float(keys.iloc[:len(texts)].mean()), 1),
+        "search_entries": len(bot.SEARCH_CACHE.data),
+        "page_entries": len(bot.PAGE_CACHE.data),
+        "bytes_per_query": grown // max(len(texts), 1),
+    }
+
+def bench_load(path: str) -> tuple:
+    """Холодне завантаження з xlsx, запис знімка і завантаження зі знімка"""
+    for leftover in (bot.snapshot_path(path),):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+    enabled = bot.SNAPSHOT_CACHE
+    try:
+        bot.SNAPSHOT_CACHE = False
+        start = time.perf_counter()
+        snapshot = bot.build_catalogue(path)
+        cold = time.perf_counter() - start
+
+        stat = os.stat(path)
+        start = time.perf_counter()
+        bot.save_snapshot(path, stat, snapshot.table, snapshot.index)
+        write = time.perf_counter() - start
+
+        bot.SNAPSHOT_CACHE = True
+        start = time.perf_counter()
+        snapshot = bot.build_catalogue(path)
+        warm = time.perf_counter() - start
+    finally:
+        bot.SNAPSHOT_CACHE = enabled
+    return snapshot, {
+        "xlsx_s": round(cold, 4),
+        "snapshot_write_s": round(write, 4),
+        "snapshot_load_s": round(warm, 4),
+        "snapshot_bytes": os.path.getsize(bot.snapshot_path(path)),
+        "dataframe_bytes": snapshot.table.source_nbytes,
+        "table_bytes": snapshot.table.nbytes(),
+        "index_bytes": bot.index_nbytes(snapshot.index),
+    }
+
+async def bench_size(rows: int, queries: int, workdir: str) -> dict:
+    path = os.path.join(workdir, f"bench-{rows}.xlsx")
+    start = time.perf_counter()
+    if not os.path.exists(path):
+        generate_workbook(path, rows)
+    generated = time.perf_counter() - start
+
+    snapshot, load = bench_load(path)
+    bot.catalogue = snapshot
+    clear_caches()
+    return {
+        "rows": rows,
+        "generate_s": round(generated, 4),
+        "load": load,
+        "search": await bench_queries(make_queries(snapshot, queries)),
+        "pagination": await bench_pagination(snapshot, 50),
+        "result_cache": await bench_result_cache(snapshot, 200),
+    }
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+async def run(args) -> dict:
+    bot.start_executor()
+    try:
+        results = [await bench_size(rows, args.queries, args.workdir) for rows in args.rows]
+    finally:
+        bot.stop_executor()
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "pandas": bot.pd.__version__,
+        "executor": bot.SEARCH_EXECUTOR,
+        "results": results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки пошуку та пагінації на синтетичній базі")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000], help="розміри баз (10000 … 1000000)")
+    parser.add_argument("--queries", type=int, default=200, help="запитів кожного виду")
+    parser.add_argument("--workdir", default=tempfile.gettempdir(), help="куди класти згенеровані xlsx")
+    parser.add_argument("--out", help="файл для JSON (за замовчуванням stdout)")
+    args = parser.parse_args()
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        sys.stdout.write(text + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -1,59 +1,1525 @@
 import os
+import asyncio
+import signal
+import json
+import hmac
+import base64
+import logging
 import pandas as pd
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
-from collections import Counter
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultArticle, InputTextMessageContent
+from telegram.error import BadRequest, RetryAfter
+from telegram.ext import Application, BaseRateLimiter, BaseUpdateProcessor, CommandHandler, CallbackQueryHandler, InlineQueryHandler, MessageHandler, filters, ContextTypes
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter, OrderedDict, deque
 import io
+import csv
+import re
+import bisect
+import array
+import zlib
+import mmap
+import multiprocessing
+import heapq
+import itertools
+import pickle
+import hashlib
+import threading
+import time
+import functools
+import contextlib
+import sys
+import sqlite3
+import tempfile
+import openpyxl
 import datetime
+import numpy as np
+
+from ingest import FRAME_COLUMNS, normalize_article, prepare_frame, read_sheets, schema_columns
 
 TOKEN = os.getenv("BOT_TOKEN")
+# Файл бази або тека з кількома книгами (.xlsx), які зводяться в одну базу
+DATA_FILE = os.getenv("DATA_FILE", "all-in-one.xlsx")
+# Скільки процесів читають аркуші книг бази паралельно; 1 — читання в основному процесі
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(min(os.cpu_count() or 1, 4))))
+# Як часто (сек) перевіряти, чи змінився файл бази; 0 — не перевіряти
+RELOAD_INTERVAL = int(os.getenv("RELOAD_INTERVAL", "60"))
+# Бінарний знімок розібраної таблиці з індексами поруч із файлом бази; "0" — вимкнено
+SNAPSHOT_CACHE = os.getenv("SNAPSHOT_CACHE", "1") != "0"
+# Розмір (записів) і час життя (сек) спільного кешу результатів пошуку та сторінок
+CACHE_SIZE = int(os.getenv("CACHE_SIZE", "2048"))
+CACHE_TTL = int(os.getenv("CACHE_TTL", "600"))
+# Скільки найкращих збігів шукати одразу; решта — лише коли користувач гортає далі або фільтрує
+SEARCH_LIMIT = int(os.getenv("SEARCH_LIMIT", "1000"))
+# Ключ підпису кнопок результатів; має бути однаковим в усіх екземплярах бота (за замовчуванням — з BOT_TOKEN)
+CALLBACK_SECRET = os.getenv("CALLBACK_SECRET", "")
+# Журнал запитів: файл SQLite, розмір буфера в пам'яті та період скидання на диск (сек)
+QUERY_LOG_DB = os.getenv("QUERY_LOG_DB", "queries.sqlite3")
+QUERY_LOG_BUFFER = int(os.getenv("QUERY_LOG_BUFFER", "10000"))
+QUERY_LOG_FLUSH = int(os.getenv("QUERY_LOG_FLUSH", "5"))
+# Де виконується пошук: "thread", "process" (WorkerPool) або "off" (у циклі подій) і скільки воркерів
+SEARCH_EXECUTOR = os.getenv("SEARCH_EXECUTOR", "thread")
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", str(os.cpu_count() or 2)))
+# Скільки оновлень обробляється одночасно (оновлення одного чату — завжди по черзі)
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", "64"))
+# Режим отримання оновлень: "polling" або "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Публічна адреса, яку реєструємо в Telegram (без шляху), і що слухає вбудований сервер
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# Скільки прийнятих, але ще не оброблених оновлень допускаємо; понад це — 503 і Telegram повторить
+WEBHOOK_QUEUE = int(os.getenv("WEBHOOK_QUEUE", "1000"))
+# Скільки секунд при зупинці чекати на обробку вже прийнятих оновлень
+WEBHOOK_DRAIN_TIMEOUT = int(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "30"))
+# Інша адреса Bot API, наприклад локальна заглушка для вимірювань (http://127.0.0.1:8081)
+BOT_API_URL = os.getenv("BOT_API_URL", "")
+# Інлайн-режим (@bot 5Q0907): скільки результатів, бюджет часу на запит (сек),
+# скільки Telegram кешує відповідь (сек) і пауза, за яку новіший запит скасовує попередній
+INLINE_LIMIT = int(os.getenv("INLINE_LIMIT", "20"))
+INLINE_BUDGET = float(os.getenv("INLINE_BUDGET", "0.2"))
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "300"))
+INLINE_DEBOUNCE = float(os.getenv("INLINE_DEBOUNCE", "0"))
+# Порт для метрик у текстовому форматі Prometheus (GET /metrics); 0 — вимкнено
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x.strip()}
+# Ліміти вихідних повідомлень: усього за секунду, в особистий чат і в групу за секунду
+SEND_RATE = float(os.getenv("SEND_RATE", "30"))
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))
+SEND_GROUP_RATE = float(os.getenv("SEND_GROUP_RATE", str(20 / 60)))
+# Скільки повідомлень поспіль можна надіслати в чат без очікування
+SEND_BURST = int(os.getenv("SEND_BURST", "3"))
+# Скільки разів повторювати запит після 429 (RetryAfter)
+SEND_RETRIES = int(os.getenv("SEND_RETRIES", "3"))
+# Скільки лічильників тримає кожна таблиця найчастіших запитів (пам'ять не залежить від потоку запитів)
+TOP_QUERIES_SIZE = int(os.getenv("TOP_QUERIES_SIZE", "200"))
+# Довші запити в статистиці обрізаються
+TOP_QUERY_LENGTH = 64
+
+logger = logging.getLogger(__name__)
+
+class QueryLog:
+    """Журнал пошукових запитів: кільцевий буфер у пам'яті, який фонова задача
+    пакетами дописує в SQLite (WAL). Запис у буфер — O(1), без звернень до диска"""
+
+    def __init__(self, path: str, capacity: int):
+        self.path = path
+        self.buffer = deque(maxlen=capacity)
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.conn = None
+
+    def add(self, query: str, lang: str, results_count: int):
+        if len(self.buffer) == self.buffer.maxlen:
+            # Диск не встигає — найстаріший запис витісняється
+            self.dropped += 1
+        self.buffer.append((time.time(), query, lang, results_count))
+
+    def connect(self) -> sqlite3.Connection:
+        if self.conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS queries ("
+                "ts REAL NOT NULL, query TEXT NOT NULL, lang TEXT NOT NULL, results_count INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS queries_ts ON queries (ts)")
+            self.conn = conn
+        return self.conn
+
+    def write(self, batch: list):
+        with self.lock:
+            conn = self.connect()
+            with conn:
+                conn.executemany("INSERT INTO queries VALUES (?, ?, ?, ?)", batch)
+
+    async def flush(self):
+        """Переносить усе з буфера в базу одним пакетом у фоновому потоці"""
+        batch = [self.buffer.popleft() for _ in range(len(self.buffer))]
+        if not batch:
+            return
+        try:
+            await asyncio.to_thread(self.write, batch)
+        except Exception:
+            self.dropped += len(batch)
+            logger.exception("Could not write %s query log entries", len(batch))
+
+    def aggregates(self) -> dict:
+        """Загальна кількість, успішні/неуспішні та розподіл за мовами"""
+        with self.lock:
+            conn = self.connect()
+            total, success = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(results_count > 0), 0) FROM queries"
+            ).fetchone()
+            by_lang = conn.execute(
+                "SELECT lang, COUNT(*) FROM queries GROUP BY lang ORDER BY COUNT(*) DESC"
+            ).fetchall()
+        return {"total": total, "success": success, "fail": total - success, "by_lang": by_lang}
+
+    def iter_rows(self, success: bool, since: float = None, until: float = None, chunk: int = 5000):
+        """Успішні або неуспішні записи за період у порядку надходження, потоково.
+        Читає окремим з'єднанням, тож фоновий запис у WAL не блокується"""
+        conditions = ["results_count > 0" if success else "results_count = 0"]
+        params = []
+        if since is not None:
+            conditions.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("ts < ?")
+            params.append(until)
+        with self.lock:
+            self.connect()
+        conn = sqlite3.connect(self.path)
+        try:
+            cursor = conn.execute(
+                f"SELECT ts, query, lang, results_count FROM queries WHERE {' AND '.join(conditions)} ORDER BY ts",
+                params
+            )
+            while True:
+                rows = cursor.fetchmany(chunk)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            conn.close()
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+QUERY_LOG = QueryLog(QUERY_LOG_DB, QUERY_LOG_BUFFER)
+
+async def flush_query_log(interval: int):
+    while True:
+        await asyncio.sleep(interval)
+        await QUERY_LOG.flush()
+
+class SpaceSaving:
+    """Найчастіші рядки потоку у фіксованій пам'яті (алгоритм Space-Saving): не більше capacity
+    лічильників. Новий рядок, коли місця немає, займає лічильник найрідшого і продовжує його рахунок,
+    тож кількість завищена щонайбільше на errors[item]; справжні важковаговики не витісняються"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+
+    def add(self, item: str, count: int = 1):
+        if item in self.counts:
+            self.counts[item] += count
+            return
+        floor = 0
+        if len(self.counts) >= self.capacity:
+            # Лінійний пошук мінімуму: capacity невелика, а витіснення буває лише для нових рядків
+            victim = min(self.counts, key=self.counts.__getitem__)
+            floor = self.counts.pop(victim)
+            del self.errors[victim]
+        self.counts[item] = floor + count
+        self.errors[item] = floor
+
+    def top(self, n: int) -> list:
+        return heapq.nlargest(n, self.counts.items(), key=lambda item: item[1])
+
+class WindowStats:
+    """Лічильники за останні span секунд: кільце з slots відрізків часу, у кожному свої
+    total/success/by_lang і Space-Saving усіх та неуспішних запитів. Відрізок, що вийшов
+    за вікно, перевикористовується при першому записі в нього"""
+
+    def __init__(self, span: int, slots: int, capacity: int):
+        self.width = span / slots
+        self.capacity = capacity
+        self.slots = [None] * slots
 
-STATS = {
-    "total": 0,
-    "success": 0,
-    "fail": 0,
-    "queries": Counter(),
-    "by_lang": Counter(),
-    "success_queries": [],
-    "fail_queries": []
-}
-
-def load_dataframe(path: str = "all-in-one.xlsx") -> pd.DataFrame:
+    def slot(self, now: float) -> dict:
+        epoch = int(now // self.width)
+        slot = self.slots[epoch % len(self.slots)]
+        if slot is None or slot["epoch"] != epoch:
+            slot = self.slots[epoch % len(self.slots)] = {
+                "epoch": epoch, "total": 0, "success": 0, "by_lang": Counter(),
+                "queries": SpaceSaving(self.capacity), "failed": SpaceSaving(self.capacity),
+            }
+        return slot
+
+    def add(self, query: str, lang: str, success: bool, now: float):
+        slot = self.slot(now)
+        slot["total"] += 1
+        slot["success"] += success
+        slot["by_lang"][lang] += 1
+        slot["queries"].add(query)
+        if not success:
+            slot["failed"].add(query)
+
+    def summary(self, now: float, n: int) -> dict:
+        """Підсумок по живих відрізках; топи — суми лічильників відрізків (оцінка зверху)"""
+        oldest = int(now // self.width) - len(self.slots)
+        live = [slot for slot in self.slots if slot is not None and slot["epoch"] > oldest]
+        result = {"total": 0, "success": 0, "by_lang": Counter()}
+        queries, failed = Counter(), Counter()
+        for slot in live:
+            result["total"] += slot["total"]
+            result["success"] += slot["success"]
+            result["by_lang"].update(slot["by_lang"])
+            queries.update(slot["queries"].counts)
+            failed.update(slot["failed"].counts)
+        result["fail"] = result["total"] - result["success"]
+        result["by_lang"] = result["by_lang"].most_common()
+        result["queries"] = queries.most_common(n)
+        result["failed"] = failed.most_common(n)
+        return result
+
+class QueryStats:
+    """Статистика запитів у сталій пам'яті: найчастіші запити з моменту запуску
+    і ковзні вікна за годину (12 відрізків по 5 хв) та добу (24 по годині)"""
+
+    def __init__(self, capacity: int):
+        self.queries = SpaceSaving(capacity)
+        self.failed = SpaceSaving(capacity)
+        self.windows = {"hour": WindowStats(3600, 12, capacity), "day": WindowStats(86400, 24, capacity)}
+
+    def add(self, text: str, lang: str, results_count: int):
+        query = text.lower()[:TOP_QUERY_LENGTH]
+        success = results_count > 0
+        now = time.time()
+        self.queries.add(query)
+        if not success:
+            self.failed.add(query)
+        for window in self.windows.values():
+            window.add(query, lang, success, now)
+
+    def summary(self, window: str, n: int = 5) -> dict:
+        return self.windows[window].summary(time.time(), n)
+
+STATS = QueryStats(TOP_QUERIES_SIZE)
+
+# Без цих колонок аркуш — не частина бази (списки, VIN-и, довідки), і його не читаємо
+SHEET_REQUIRED = ("Article", "Dataset")
+
+def workbook_paths(path: str) -> list:
+    """Книги бази: сам path або всі .xlsx у теці path (без тимчасових файлів Excel "~$...")"""
+    if not os.path.isdir(path):
+        return [path]
+    return sorted(os.path.join(path, name) for name in os.listdir(path)
+                  if name.lower().endswith(".xlsx") and not name.startswith(("~$", ".")))
+
+def catalogue_sheets(book: str) -> list:
+    """Аркуші книги, рядок заголовків яких зводиться до схеми бази (див. SHEET_REQUIRED)"""
+    workbook = openpyxl.load_workbook(book, read_only=True)
     try:
-        df = pd.read_excel(path)
-    except Exception:
-        df = pd.DataFrame(columns=["Article", "Version", "Dataset", "Model", "Year", "Region", "Unit"])
-    for col in ["Article", "Version", "Dataset", "Model", "Year", "Region", "Unit"]:
-        if col not in df.columns:
-            df[col] = ""
+        sheets = []
+        for sheet in workbook.worksheets:
+            header = next(sheet.iter_rows(max_row=1, values_only=True), ())
+            if all(col in schema_columns(header).values() for col in SHEET_REQUIRED):
+                sheets.append(sheet.title)
+            else:
+                logger.info("Sheet %s in %s is not a catalogue sheet, skipped", sheet.title, book)
+        return sheets
+    finally:
+        workbook.close()
+
+def load_dataframe(path: str = DATA_FILE, strict: bool = False) -> tuple:
+    """Усі аркуші бази з усіх книг path (файлу чи теки), зведені в одну таблицю.
+    Повертає (таблиця, помилки): книга чи аркуш, що не прочитався, лише потрапляє в помилки
+    ("книга / аркуш: причина"), решта бази завантажується. strict — виняток, якщо не прочитано нічого"""
+    jobs, errors = [], []
+    for book in workbook_paths(path):
+        try:
+            jobs += [(book, sheet) for sheet in catalogue_sheets(book)]
+        except Exception as e:
+            errors.append(f"{os.path.basename(book)}: {e}")
+    frames = []
+    for (book, sheet), result in zip(jobs, read_sheets(jobs, INGEST_WORKERS)):
+        if isinstance(result, Exception):
+            errors.append(f"{os.path.basename(book)} / {sheet}: {result}")
+        else:
+            frames.append(result)
+    for error in errors:
+        logger.warning("Could not read catalogue source %s", error)
+    if not frames:
+        if strict:
+            raise ValueError("; ".join(errors) or f"у {path} немає аркушів бази")
+        frames = [prepare_frame(pd.DataFrame(columns=["Article", "Version", "Dataset", "Model", "Year", "Region", "Unit"]))]
+    return pd.concat(frames, ignore_index=True)[list(FRAME_COLUMNS)], errors
+
+# Колонки з кількома сотнями різних значень на всю базу — коди категорій
+CATEGORY_COLUMNS = ("Version", "Model", "Region", "Unit")
+# Майже унікальні рядки — один буфер UTF-8 на колонку
+STRING_COLUMNS = ("Article", "Dataset", "ArticleKey")
+
+def blank_mask(series: pd.Series) -> pd.Series:
+    """Порожні комірки: NaN, пробіли і рядок "nan", який лишає astype(str)"""
+    text = series.astype(object).astype(str)
+    return series.isna() | text.str.strip().eq("") | text.str.lower().eq("nan")
+
+class StringColumn:
+    """Рядки колонки в одному буфері UTF-8: значення pos — data[offsets[pos]:offsets[pos + 1]].
+    Порожній рядок означає пропуск. data — bytes або memoryview (знімок, відображений через mmap)"""
+
+    def __init__(self, values: list):
+        encoded = [value.encode() for value in values]
+        self.data = b"".join(encoded)
+        self.offsets = np.zeros(len(encoded) + 1, dtype=np.int32 if len(self.data) < 2**31 else np.int64)
+        self.offsets[1:] = np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)))
+        self.ascii = self.data.isascii()
+        self.lines = None
+
+    def __reduce_ex__(self, protocol):
+        # Протокол 5 віддає буфер окремо від потоку pickle — так його можна відобразити через mmap
+        data = pickle.PickleBuffer(self.data) if protocol >= 5 else bytes(self.data)
+        return restore_string_column, (data, self.offsets, self.ascii)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, pos: int) -> str:
+        return str(self.data[self.offsets[pos]:self.offsets[pos + 1]], "utf-8")
+
+    def tolist(self) -> list:
+        bounds = self.offsets.tolist()
+        if self.ascii:
+            # Для ASCII зміщення в байтах збігаються зі зміщеннями в символах
+            text = str(self.data, "ascii")
+            return [text[a:b] for a, b in zip(bounds, bounds[1:])]
+        return [str(self.data[a:b], "utf-8") for a, b in zip(bounds, bounds[1:])]
+
+    def joined(self) -> tuple:
+        """Уся колонка одним рядком через "\n" і початки значень у ньому (на одне більше, ніж значень) —
+        для регулярних виразів по всій колонці. Будується при першому виклику в кожному процесі
+        й у знімок не потрапляє (див. __reduce_ex__)"""
+        if self.lines is None:
+            values = self.tolist()
+            if self.ascii:
+                starts = self.offsets.astype(np.int64) + np.arange(len(values) + 1)
+            else:
+                starts = np.zeros(len(values) + 1, dtype=np.int64)
+                starts[1:] = np.cumsum(np.fromiter(map(len, values), dtype=np.int64, count=len(values)) + 1)
+            self.lines = ("\n".join(values), starts)
+        return self.lines
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data) + self.offsets.nbytes
+
+def restore_string_column(data, offsets: np.ndarray, ascii: bool) -> StringColumn:
+    column = StringColumn.__new__(StringColumn)
+    column.data = data
+    column.offsets = offsets
+    column.ascii = ascii
+    column.lines = None
+    return column
+
+class CompactTable:
+    """Таблиця бази без окремого об'єкта Python на кожну комірку: CATEGORY_COLUMNS —
+    pd.Categorical, Year — Int16 з пропусками, STRING_COLUMNS — StringColumn.
+    Зайві колонки файлу (VIN тощо) бот не показує, тому вони не зберігаються"""
+
+    def __init__(self, frame: pd.DataFrame):
+        self.length = len(frame)
+        # Розмір вихідної таблиці — для порівняння в /perf
+        self.source_nbytes = int(frame.memory_usage(deep=True).sum())
+        try:
+            # Рахуємо рядки, де хоча б одна комірка не пуста
+            self.filled_rows = frame.dropna(how='all').shape[0]
+        except Exception:
+            self.filled_rows = 0
+        self.columns = {}
+        for col in STRING_COLUMNS:
+            text = frame[col].astype(object).astype(str).mask(blank_mask(frame[col]), "")
+            self.columns[col] = StringColumn(text.tolist())
+        for col in CATEGORY_COLUMNS:
+            text = frame[col].astype(object).astype(str).mask(blank_mask(frame[col]))
+            self.columns[col] = pd.Categorical(text)
+        years = pd.to_numeric(frame["Year"], errors="coerce")
+        if (years.isna() & ~blank_mask(frame["Year"])).any():
+            # У файлі є роки не числом ("2015-2018") — зберігаємо як категорії, щоб не втратити
+            self.columns["Year"] = pd.Categorical(frame["Year"].astype(object).astype(str).mask(blank_mask(frame["Year"])))
+        else:
+            self.columns["Year"] = pd.array(years.where(years.between(0, 9999)).round(), dtype="Int16")
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, col: str) -> pd.Series:
+        """Колонка як pd.Series (для рідкісних повних проходів; рядки розпаковуються щоразу)"""
+        column = self.columns[col]
+        if isinstance(column, StringColumn):
+            return pd.Series([value or None for value in column.tolist()], dtype=object)
+        return pd.Series(column)
+
+    def text(self, col: str, pos: int) -> str:
+        """Значення комірки для картки; пропуск — "---", як у clean()"""
+        column = self.columns[col]
+        if isinstance(column, StringColumn):
+            value = column[pos]
+        elif isinstance(column, pd.Categorical):
+            code = column.codes[pos]
+            value = str(column.categories[code]) if code >= 0 else ""
+        else:
+            value = "" if pd.isna(column[pos]) else str(column[pos])
+        return value if value.strip() else "---"
+
+    def card_values(self, pos: int) -> tuple:
+        return tuple(self.text(col, pos) for col, _ in CARD_FIELDS)
+
+    def take(self, col: str, rows: np.ndarray) -> list:
+        """Значення колонки для рядків rows одним проходом; пропуск — порожній рядок"""
+        column = self.columns[col]
+        if isinstance(column, StringColumn):
+            return [column[pos] for pos in rows.tolist()]
+        values = pd.Series(column.take(rows) if isinstance(column, pd.Categorical) else column[rows])
+        return values.astype(object).where(values.notna(), "").astype(str).tolist()
+
+    def frame(self, rows: np.ndarray = None) -> pd.DataFrame:
+        """Рядки таблиці назад як результат load_dataframe (пропуски — порожні рядки), для ущільнення"""
+        if rows is None:
+            rows = np.arange(self.length)
+        return pd.DataFrame({col: self.take(col, rows) for col in FRAME_COLUMNS})
+
+    def checksum(self, crc: int = 0) -> int:
+        """crc32 усього вмісту таблиці"""
+        for col in sorted(self.columns):
+            column = self.columns[col]
+            if isinstance(column, StringColumn):
+                crc = zlib.crc32(column.offsets, zlib.crc32(column.data, crc))
+            elif isinstance(column, pd.Categorical):
+                crc = zlib.crc32("\0".join(map(str, column.categories)).encode(), crc)
+                crc = zlib.crc32(column.codes, crc)
+            else:
+                crc = zlib.crc32(column.to_numpy(dtype=np.int32, na_value=-1), crc)
+        return crc
+
+    def nbytes(self) -> int:
+        total = 0
+        for column in self.columns.values():
+            if isinstance(column, pd.Categorical):
+                total += column.codes.nbytes + int(column.categories.memory_usage(deep=True))
+            else:
+                total += column.nbytes
+        return total
+
+# Колонки, по яких працює текстовий пошук
+SEARCH_COLUMNS = ("Article", "Dataset")
+
+# Символи, з якими запит вже не є простим підрядком для str.contains
+REGEX_SPECIAL = re.compile(r"[.^$*+?{}\[\]\\|()]")
+
+def trigrams(value: str) -> set:
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+def gram_code(gram: str) -> int:
+    """Код триграми: три 21-бітні символи Unicode в одному 64-бітному числі"""
+    return (ord(gram[0]) << 42) | (ord(gram[1]) << 21) | ord(gram[2])
+
+class TrigramIndex:
+    """Інвертований індекс триграм однієї колонки: триграма -> відсортовані номери рядків.
+    Усі списки лежать в одному масиві rows; grams — відсортовані коди триграм, offsets — межі їхніх списків"""
+
+    def __init__(self, column: StringColumn):
+        postings = {}
+        unindexed = []
+        # Буфер колонки в нижньому регістрі: bytes.lower змінює лише ASCII, тож не-ASCII рядки
+        # (кирилиця) дописуються окремо через str.lower
+        lowered = bytearray(column.data).lower()
+        offsets = column.offsets.tolist()
+        for pos, value in enumerate(column.tolist()):
+            value = value.lower()
+            if not value.isascii():
+                encoded = value.encode()
+                if len(encoded) != offsets[pos + 1] - offsets[pos]:
+                    # Рідкісні літери, в яких str.lower змінює довжину ("İ") — такі рядки перевіряються регуляркою
+                    unindexed.append(pos)
+                    continue
+                lowered[offsets[pos]:offsets[pos + 1]] = encoded
+            for gram in trigrams(value):
+                postings.setdefault(gram_code(gram), []).append(pos)
+        codes = sorted(postings)
+        self.grams = np.array(codes, dtype=np.int64)
+        self.offsets = np.zeros(len(codes) + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum([len(postings[code]) for code in codes])
+        self.rows = np.fromiter((pos for code in codes for pos in postings[code]), dtype=np.int32, count=self.offsets[-1])
+        self.unindexed = np.array(unindexed, dtype=np.int32)
+        # Лишається bytes, а не масивом зі спільного знімка: він невеликий, а bytes.find тут найшвидший
+        self.lowered = bytes(lowered)
+
+    def candidates(self, text: str) -> np.ndarray:
+        """Рядки, що містять усі триграми запиту (надмножина справжніх збігів)"""
+        codes = np.array([gram_code(gram) for gram in trigrams(text.lower())], dtype=np.int64)
+        # Один пошук для всіх триграм: виклик searchsorted дорожчий за сам бінарний пошук
+        at = np.minimum(np.searchsorted(self.grams, codes), len(self.grams) - 1)
+        if not len(self.grams) or (self.grams[at] != codes).any():
+            return np.empty(0, dtype=np.int32)
+        lists = [self.rows[a:b] for a, b in zip(self.offsets[at].tolist(), self.offsets[at + 1].tolist())]
+        lists.sort(key=len)
+        result = lists[0]
+        for rows in lists[1:]:
+            if not result.size:
+                break
+            result = np.intersect1d(result, rows, assume_unique=True)
+        return result
+
+    def search(self, text: str, column: StringColumn, limit: int = None) -> np.ndarray:
+        """Точні збіги підрядка text (без спецсимволів regex) у column без урахування регістру, відсортовані.
+        З limit — лише перші limit збігів: перевірка кандидатів зупиняється, щойно їх набрано"""
+        candidates = self.candidates(text)
+        if len(text) == 3:
+            # Одна триграма — кожен кандидат уже містить запит
+            hits = candidates[:limit].tolist()
+        else:
+            needle = text.lower().encode()
+            lowered = self.lowered
+            offsets = column.offsets.tolist() if len(candidates) > 1000 else column.offsets
+            step = max(limit or len(candidates), 256)
+            hits = []
+            for start in range(0, len(candidates), step):
+                # find у межах рядка не копіює його, на відміну від зрізу
+                hits += [pos for pos in candidates[start:start + step].tolist()
+                         if lowered.find(needle, offsets[pos], offsets[pos + 1]) >= 0]
+                if limit is not None and len(hits) >= limit:
+                    break
+        if self.unindexed.size:
+            pattern = re.compile(text, re.IGNORECASE)
+            hits.extend(pos for pos in self.unindexed.tolist() if pattern.search(column[pos]))
+            hits.sort()
+        return np.array(hits[:limit], dtype=np.int32)
+
+    def scan(self, text: str, column: StringColumn, limit: int = None) -> np.ndarray:
+        """Збіги запиту, коротшого за триграму, прямим проходом по lowered: порівняння байтів
+        numpy по всьому буферу, а не розпакування колонки в рядки Python"""
+        needle = np.frombuffer(text.lower().encode(), dtype=np.uint8)
+        data = np.frombuffer(self.lowered, dtype=np.uint8)
+        span = len(data) - len(needle) + 1
+        if not len(needle):
+            # Порожній запит, як і str.contains(""), збігається з кожним непорожнім значенням
+            hits = np.flatnonzero(np.diff(column.offsets) > 0)
+        elif span <= 0:
+            hits = np.empty(0, dtype=np.int64)
+        else:
+            found = data[:span] == needle[0]
+            for pos in range(1, len(needle)):
+                found &= data[pos:span + pos] == needle[pos]
+            starts = np.flatnonzero(found)
+            rows = np.searchsorted(column.offsets, starts, "right") - 1
+            # Збіг, що перетинає межу двох значень, не рахується
+            rows = rows[starts + len(needle) <= column.offsets[rows + 1]]
+            hits = rows[np.r_[True, rows[1:] != rows[:-1]]] if len(rows) else rows
+        if self.unindexed.size:
+            # У lowered ці рядки лишилися в початковому регістрі — перевіряються регуляркою, як у search()
+            pattern = re.compile(re.escape(text), re.IGNORECASE)
+            extra = [pos for pos in self.unindexed.tolist() if pattern.search(column[pos])]
+            hits = np.union1d(np.setdiff1d(hits, self.unindexed), extra)
+        return hits[:limit].astype(np.int32)
+
+class PrefixIndex:
+    """Відсортований масив ключів для пошуку за префіксом бінарним пошуком.
+    ranks — заздалегідь обчислена вага рядка для видачі top-k (більше — вище)"""
+
+    def __init__(self, column: StringColumn, ranks: np.ndarray = None):
+        keys = column.tolist()
+        order = sorted((pos for pos, key in enumerate(keys) if key), key=keys.__getitem__)
+        # bisect працює з будь-якою послідовністю, тож ключі лишаються в компактному буфері
+        self.keys = StringColumn([keys[pos] for pos in order])
+        self.rows = np.array(order, dtype=np.int32)
+        self.ranks = np.asarray(ranks)[self.rows] if ranks is not None else np.zeros(len(order), dtype=np.int32)
+
+    def bounds(self, key: str) -> tuple:
+        lo = bisect.bisect_left(self.keys, key)
+        hi = bisect.bisect_left(self.keys, key + "\U0010ffff", lo)
+        return lo, hi
+
+    def exact(self, key: str) -> np.ndarray:
+        """Номери рядків із ключем рівно key"""
+        lo = bisect.bisect_left(self.keys, key)
+        return self.rows[lo:bisect.bisect_right(self.keys, key, lo)]
+
+    def prefix(self, key: str) -> np.ndarray:
+        """Відсортовані номери рядків, ключ яких починається з key"""
+        lo, hi = self.bounds(key)
+        return np.sort(self.rows[lo:hi])
+
+    def top(self, key: str, limit: int) -> np.ndarray:
+        """До limit рядків із префіксом key за спаданням ваги, без повного сортування діапазону"""
+        return self.ranked(key, limit)[0]
+
+    def ranked(self, key: str, limit: int) -> tuple:
+        """top() разом із вагами знайдених рядків — щоб злити видачі кількох індексів"""
+        lo, hi = self.bounds(key)
+        ranks = self.ranks[lo:hi]
+        if len(ranks) > limit:
+            best = np.argpartition(-ranks, limit)[:limit]
+        else:
+            best = np.arange(len(ranks))
+        best = best[np.lexsort((best, -ranks[best]))]
+        return self.rows[lo + best], ranks[best]
+
+def article_ranks(frame: pd.DataFrame) -> np.ndarray:
+    """Вага для підказок: спершу найкоротші ключі (найближчі до введеного), далі новіші роки"""
+    years = pd.to_numeric(frame["Year"], errors="coerce").fillna(0).clip(0, 9999).astype(np.int64)
+    lengths = frame["ArticleKey"].str.len().fillna(0).clip(upper=31).astype(np.int64)
+    return ((32 - lengths) * 10000 + years).to_numpy(dtype=np.int32)
+
+def levenshtein(a: str, b: str, limit: int) -> int:
+    """Відстань редагування; якщо вона більша за limit, повертає limit + 1"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if min(cur) > limit:
+            return limit + 1
+        prev = cur
+    return prev[-1]
+
+def deletes(word: str, max_distance: int) -> set:
+    """Слово і всі його варіанти з видаленими до max_distance символами"""
+    result = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        result |= frontier
+    return result
+
+def variant_hashes(word: str, max_distance: int) -> list:
+    return [zlib.crc32(variant.encode()) for variant in deletes(word, max_distance)]
+
+class DeletionIndex:
+    """Індекс у стилі SymSpell для підказок при помилках в артикулі:
+    crc32 варіантів префікса ключа з видаленими символами (hashes, відсортовані) -> номер ключа (ids).
+    Колізії хешів безпечні: кожного кандидата перевіряє levenshtein"""
+
+    def __init__(self, keys: pd.Series, articles: pd.Series, max_distance: int = 2, prefix_length: int = 12):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        # Один артикул для показу на кнопці на кожен нормалізований ключ
+        first = {}
+        for key, article in zip(keys, articles):
+            if key and key not in first:
+                first[key] = str(article)
+        self.keys = StringColumn(list(first))
+        self.articles = StringColumn(list(first.values()))
+        hashes = array.array("I")
+        counts = np.zeros(len(first), dtype=np.int64)
+        for i, key in enumerate(first):
+            found = variant_hashes(key[:prefix_length], max_distance)
+            hashes.extend(found)
+            counts[i] = len(found)
+        hashes = np.frombuffer(hashes, dtype=np.uint32)
+        order = np.argsort(hashes, kind="stable")
+        self.hashes = hashes[order]
+        self.ids = np.repeat(np.arange(len(first), dtype=np.int32), counts)[order]
+
+    def suggest(self, text: str, limit: int = 5) -> list:
+        """Найближчі артикули на відстані до max_distance, від найближчого"""
+        return [article for _, _, article in self.matches(text)[:limit]]
+
+    def matches(self, text: str) -> list:
+        """Усі (відстань, ключ, артикул) на відстані до max_distance, від найближчого"""
+        key = normalize_article(text)
+        if len(key) < 3:
+            return []
+        wanted = np.array(variant_hashes(key[:self.prefix_length], self.max_distance), dtype=np.uint32)
+        lo = np.searchsorted(self.hashes, wanted, "left").tolist()
+        hi = np.searchsorted(self.hashes, wanted, "right").tolist()
+        found = [self.ids[a:b] for a, b in zip(lo, hi) if b > a]
+        if not found:
+            return []
+        hits = []
+        for i in np.unique(np.concatenate(found)).tolist():
+            candidate = self.keys[i]
+            distance = levenshtein(key, candidate, self.max_distance)
+            if distance <= self.max_distance:
+                hits.append((distance, candidate, i))
+        hits.sort()
+        return [(distance, candidate, self.articles[i]) for distance, candidate, i in hits]
+
+# Колонки для уточнення результатів і ключі їхніх підписів у LANGUAGES[lang]["labels"]
+FACET_FIELDS = (
+    ("Model", "model"),
+    ("Year", "year"),
+    ("Region", "region"),
+    ("Unit", "unit"),
+)
+
+class FacetIndex:
+    """Відсортовані множини номерів рядків для кожного значення Model/Year/Region/Unit.
+    Для колонки зберігаються коди значень по рядках (codes), номери рядків, згруповані
+    за кодом (rows), і межі груп (offsets) — без окремого масиву на кожне значення"""
+
+    def __init__(self, frame: pd.DataFrame):
+        self.values = {}
+        self.codes = {}
+        self.rows = {}
+        self.offsets = {}
+        for col, _ in FACET_FIELDS:
+            # Значення такі ж, як у картці, тож кнопка збігається з тим, що бачить користувач
+            codes, labels = pd.factorize(pd.Series(clean_column(frame[col]), dtype=object), sort=True)
+            self.values[col] = [str(label) for label in labels]
+            self.codes[col] = codes.astype(np.int32)
+            # Стабільне сортування: всередині групи номери рядків ідуть за зростанням
+            self.rows[col] = np.argsort(codes, kind="stable").astype(np.int32)
+            self.offsets[col] = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=len(labels)))))
+
+    def code(self, col: str, label: str):
+        values = self.values[col]
+        i = bisect.bisect_left(values, label)
+        return i if i < len(values) and values[i] == label else None
+
+    def members(self, col: str, code: int) -> np.ndarray:
+        offsets = self.offsets[col]
+        return self.rows[col][offsets[code]:offsets[code + 1]]
+
+    def counts(self, col: str, rows: np.ndarray) -> list:
+        """(код, кількість) значень колонки серед rows, від найчастішого"""
+        return ranked_counts(np.bincount(self.codes[col][rows], minlength=len(self.values[col])))
+
+    def contains(self, rows: np.ndarray, col: str, code: int) -> np.ndarray:
+        """Маска рядків rows зі значенням code: бінарний пошук кожного рядка серед members"""
+        members = self.members(col, code)
+        if not len(members):
+            return np.zeros(len(rows), dtype=bool)
+        pos = np.minimum(np.searchsorted(members, rows), len(members) - 1)
+        return members[pos] == rows
+
+    def refine(self, rows: np.ndarray, col: str, code: int) -> np.ndarray:
+        """Перетин rows з рядками значення, порядок rows зберігається"""
+        return rows[self.contains(rows, col, code)]
+
+def ranked_counts(counts: np.ndarray) -> list:
+    """(код, кількість) ненульових лічильників, від найчастішого"""
+    present = np.flatnonzero(counts)
+    order = present[np.argsort(-counts[present], kind="stable")]
+    return [(int(code), int(counts[code])) for code in order]
+
+class LayeredFacets:
+    """FacetIndex знімка і FacetIndex змін поверх нього як один індекс: коди — номери значень
+    у спільному відсортованому списку, рядки змін мають номери від offset"""
+
+    def __init__(self, base: FacetIndex, delta: FacetIndex, offset: int):
+        self.base = base
+        self.delta = delta
+        self.offset = offset
+        self.values = {}
+        # Для кожної колонки: спільні коди значень base і delta
+        self.maps = {}
+        for col, _ in FACET_FIELDS:
+            values = sorted(set(base.values[col]) | set(delta.values[col]))
+            position = {label: i for i, label in enumerate(values)}
+            self.values[col] = values
+            self.maps[col] = tuple(np.array([position[label] for label in part.values[col]], dtype=np.int32)
+                                   for part in (base, delta))
+
+    def code(self, col: str, label: str):
+        return FacetIndex.code(self, col, label)
+
+    def counts(self, col: str, rows: np.ndarray) -> list:
+        added = rows >= self.offset
+        base_map, delta_map = self.maps[col]
+        codes = np.concatenate((base_map[self.base.codes[col][rows[~added]]],
+                                delta_map[self.delta.codes[col][rows[added] - self.offset]]))
+        return ranked_counts(np.bincount(codes, minlength=len(self.values[col])))
+
+    def refine(self, rows: np.ndarray, col: str, code: int) -> np.ndarray:
+        label = self.values[col][code]
+        keep = np.zeros(len(rows), dtype=bool)
+        added = rows >= self.offset
+        for part, where, shift in ((self.base, np.flatnonzero(~added), 0), (self.delta, np.flatnonzero(added), self.offset)):
+            part_code = part.code(col, label)
+            if part_code is not None and len(where):
+                keep[where] = part.contains(rows[where] - shift, col, part_code)
+        return rows[keep]
+
+def index_nbytes(index: dict) -> int:
+    """Приблизний розмір індексів: масиви numpy плюс контейнери Python"""
+    total = 0
+    for part in index.values():
+        for value in vars(part).values():
+            if isinstance(value, np.ndarray):
+                total += value.nbytes
+            elif isinstance(value, dict):
+                total += sys.getsizeof(value)
+                total += sum(v.nbytes if isinstance(v, np.ndarray) else sys.getsizeof(v) for v in value.values())
+            elif isinstance(value, list):
+                total += sys.getsizeof(value) + sum(sys.getsizeof(v) for v in value)
+            elif isinstance(value, (bytes, StringColumn)):
+                total += len(value) if isinstance(value, bytes) else value.nbytes
+    return total
+
+def build_search_index(frame: pd.DataFrame, table: CompactTable) -> dict:
+    index = {col: TrigramIndex(table.columns[col]) for col in SEARCH_COLUMNS}
+    index["ArticleKey"] = PrefixIndex(table.columns["ArticleKey"], article_ranks(frame))
+    index["fuzzy"] = DeletionIndex(frame["ArticleKey"], frame["Article"])
+    index["facets"] = FacetIndex(frame)
+    return index
+
+# Конструкції, яким у колонці одним рядком видно сусідні значення: перегляд назад/вперед,
+# вбудовані прапорці, \A, \Z і \z. З ними regex_rows перевіряє значення по одному
+REGEX_CONTEXT = re.compile(r"\(\?|\\[AZz]")
+
+def regex_rows(column: StringColumn, text: str, limit: int = None) -> np.ndarray:
+    """Номери непорожніх значень column, де є збіг регулярного виразу text без урахування регістру
+    (як str.contains(text, case=False)). Вираз шукається по column.joined(): після кожного збігу
+    пошук перескакує на наступне значення, тож рідкісні збіги майже нічого не коштують.
+    Щойно збіги трапляються в кожному шістнадцятому значенні, решта перевіряється по одному"""
+    if REGEX_CONTEXT.search(text) or b"\n" in column.data:
+        pattern = re.compile(text, re.IGNORECASE)
+        values = ((pos, value) for pos, value in enumerate(column.tolist()) if value and pattern.search(value))
+        return np.fromiter((pos for pos, _ in itertools.islice(values, limit)), dtype=np.int32)
+    # MULTILINE — щоб ^ і $ спрацьовували на межах значень усередині joined
+    pattern = re.compile(text, re.IGNORECASE | re.MULTILINE)
+    joined, starts = column.joined()
+    bounds = starts.tolist()
+    hits = []
+    row = 0
+    while row < len(column) and (limit is None or len(hits) < limit):
+        match = pattern.search(joined, bounds[row])
+        if match is None:
+            break
+        row = bisect.bisect_right(bounds, match.start(), row) - 1
+        start, end = bounds[row], bounds[row + 1] - 1
+        # Збіг, що захопив "\n", ще не означає збігу в самому значенні — його перевіряємо окремо
+        if end > start and (match.end() <= end or pattern.search(joined, start, end)):
+            hits.append(row)
+        row += 1
+        if len(hits) >= 64 and len(hits) * 16 > row:
+            # Решта значень пачками: map викликає search без циклу Python на кожне значення
+            for first in range(row, len(column), 4096):
+                last = min(first + 4096, len(column))
+                ends = starts[first + 1:last + 1] - 1
+                found = np.fromiter(map(bool, map(pattern.search, itertools.repeat(joined), bounds[first:last], ends.tolist())),
+                                    dtype=bool, count=last - first)
+                hits.extend((np.flatnonzero(found & (ends > starts[first:last])) + first).tolist())
+                if limit is not None and len(hits) >= limit:
+                    break
+            break
+    return np.array(hits[:limit], dtype=np.int32)
+
+def search_rows(table: CompactTable, index: dict, text: str, limit: int = None) -> tuple:
+    """Номери рядків, де Article або Dataset містить text (без урахування регістру),
+    плюс рядки, нормалізований артикул яких починається з нормалізованого запиту.
+    Повертає (рядки, ранги) за релевантністю: точний артикул (0), префікс артикула (1),
+    підрядок в Article (2), збіг лише в Dataset (3); у межах рангу — в порядку таблиці.
+    Кожен ранг уже відсортований, тож видача — їх послідовне з'єднання без спільного
+    сортування, а з limit пошук зупиняється, щойно набрано limit найкращих рядків"""
+    key = normalize_article(text)
+    stages = []
+    if len(key) >= 3:
+        stages.append(lambda n: index["ArticleKey"].exact(key))
+        stages.append(lambda n: np.sort(index["ArticleKey"].prefix(key)))
+    if len(text) < 3 or REGEX_SPECIAL.search(text):
+        # Регулярний вираз чи надто короткий запит індекс не покриває — повний прохід по колонці
+        for col in SEARCH_COLUMNS:
+            if REGEX_SPECIAL.search(text):
+                stages.append(lambda n, col=col: regex_rows(table.columns[col], text, n))
+            else:
+                stages.append(lambda n, col=col: index[col].scan(text, table.columns[col], n))
+    else:
+        for col in SEARCH_COLUMNS:
+            # Збіги попередніх рангів відкидаються, тож limit нових рядків точно знайдеться серед перших limit
+            stages.append(lambda n, col=col: index[col].search(text, table.columns[col], n))
+    first = 4 - len(stages)
+    found, ranks = [], []
+    seen = np.empty(0, dtype=np.int32)
+    for tier, stage in enumerate(stages, start=first):
+        rows = np.asarray(stage(limit)).astype(np.int32, copy=False)
+        if len(seen):
+            rows = rows[~np.isin(rows, seen, assume_unique=True)]
+        if limit is not None:
+            rows = rows[:limit - len(seen)]
+        found.append(rows)
+        ranks.append(np.full(len(rows), tier, dtype=np.int8))
+        seen = np.union1d(seen, rows)
+        if limit is not None and len(seen) >= limit:
+            break
+    return np.concatenate(found).astype(np.int32, copy=False), np.concatenate(ranks)
+
+# Поля картки результату: (колонка, ключ підпису в LANGUAGES[lang]["labels"])
+CARD_FIELDS = (
+    ("Article", "article"),
+    ("Version", "version"),
+    ("Dataset", "dataset"),
+    ("Model", "model"),
+    ("Year", "year"),
+    ("Region", "region"),
+    ("Unit", "unit"),
+)
+
+def clean_column(series: pd.Series) -> list:
+    """Те саме, що clean() для кожного значення, але одним проходом по колонці"""
+    return series.astype(object).astype(str).mask(blank_mask(series), "---").tolist()
+
+class Delta:
+    """Зміни з адмінських файлів поверх знімка до наступного ущільнення.
+    Додані й замінені рядки — окрема маленька таблиця зі своїми індексами, їхні номери
+    йдуть після рядків знімка (від offset); dead — відсортовані номери прихованих рядків знімка.
+    changes — застосовані пакети змін по порядку, щоб повторити їх поверх нового знімка"""
+
+    def __init__(self, offset: int, frame: pd.DataFrame, dead: np.ndarray, changes: tuple):
+        self.offset = offset
+        self.frame = frame.reset_index(drop=True)
+        self.table = CompactTable(self.frame)
+        self.index = build_search_index(self.frame, self.table)
+        self.dead = dead
+        self.changes = changes
+
+    def merge(self, base: np.ndarray, added: np.ndarray) -> np.ndarray:
+        """Рядки знімка без прихованих, потім рядки змін"""
+        base = np.asarray(base, dtype=np.int32)
+        added = np.asarray(added, dtype=np.int32) + np.int32(self.offset)
+        return np.concatenate((base[~np.isin(base, self.dead)], added))
+
+    def rank(self, base: tuple, added: tuple, limit: int = None) -> np.ndarray:
+        """Дві видачі search_rows (знімка і змін) в одну за рангом; у межах рангу рядки змін
+        ідуть після рядків знімка, як і їхні номери"""
+        alive = ~np.isin(base[0], self.dead)
+        rows = np.concatenate((base[0][alive], added[0] + np.int32(self.offset))).astype(np.int32, copy=False)
+        ranks = np.concatenate((base[1][alive], added[1]))
+        return rows[np.argsort(ranks, kind="stable")[:limit]]
+
+class Catalogue:
+    """Незмінний знімок бази: таблиця, індекси та метадані.
+    Обробники беруть посилання на поточний знімок один раз, тому
+    перезавантаження не зачіпає пошуки, що вже виконуються.
+    Номери рядків від len(table) належать змінам delta (див. Delta)"""
+
+    def __init__(self, path: str, table: CompactTable, index: dict, mtime, version: int, image: str = None,
+                 delta: Delta = None, errors: tuple = ()):
+        self.path = path
+        self.table = table
+        self.index = index
+        self.mtime = mtime
+        self.version = version
+        # Файл знімка, з якого відображені таблиця й індекси (його ж відображають процеси WorkerPool)
+        self.image = image
+        self.delta = delta
+        # Книги й аркуші, які не вдалося прочитати при завантаженні (див. load_dataframe)
+        self.errors = errors
+        self.filled_rows = table.filled_rows
+        self.facets = index["facets"]
+        if delta is not None:
+            self.filled_rows += delta.table.filled_rows - len(delta.dead)
+            self.facets = LayeredFacets(index["facets"], delta.index["facets"], delta.offset)
+        # Готові картки по мовах, заповнюються при першому показі рядка
+        self.cards = {}
+        # Розмір готових карток рахується при створенні, щоб метрики не обходили всі картки
+        self.cards_bytes = 0
+        self.memory = None
+        self.digest = None
+
+    def __len__(self) -> int:
+        if self.delta is None:
+            return len(self.table)
+        return len(self.table) - len(self.delta.dead) + len(self.delta.table)
+
+    @property
+    def fingerprint(self) -> str:
+        """Короткий відбиток вмісту бази (4 символи). На відміну від version, яка рахується
+        від запуску процесу, однаковий у всіх екземплярах бота з тими самими даними"""
+        if self.digest is None:
+            crc = self.table.checksum()
+            if self.delta is not None:
+                crc = zlib.crc32(self.delta.dead, self.delta.table.checksum(crc))
+            self.digest = base64.urlsafe_b64encode(crc.to_bytes(4, "big")[1:]).decode()
+        return self.digest
+
+    def search(self, text: str, limit: int = None) -> np.ndarray:
+        """search_rows по знімку разом зі змінами, найрелевантніші спершу"""
+        if self.delta is None:
+            return search_rows(self.table, self.index, text, limit)[0]
+        # Приховані рядки знімка відкидаються вже після обмеження, тож їх добираємо наперед, як і в top()
+        found = search_rows(self.table, self.index, text, limit + len(self.delta.dead) if limit is not None else None)
+        return self.delta.rank(found, search_rows(self.delta.table, self.delta.index, text, limit), limit)
+
+    def suggest(self, text: str, limit: int = 5) -> list:
+        if self.delta is None:
+            return self.index["fuzzy"].suggest(text, limit)
+        hits = sorted(self.delta.index["fuzzy"].matches(text) + self.index["fuzzy"].matches(text))
+        result = []
+        for _, key, article in hits:
+            # Артикул лише з прихованих рядків знімка вже не знайдеться
+            if article not in result and len(self.delta.merge(self.index["ArticleKey"].exact(key),
+                                                                self.delta.index["ArticleKey"].exact(key))):
+                result.append(article)
+                if len(result) == limit:
+                    break
+        return result
+
+    def top(self, key: str, limit: int) -> np.ndarray:
+        """PrefixIndex.top зі змінами: найкращі рядки знімка (без прихованих) і змін, злиті за вагою;
+        за рівної ваги — у порядку номерів, тож рядки знімка йдуть перед доданими"""
+        if self.delta is None:
+            return self.index["ArticleKey"].top(key, limit)
+        rows, ranks = self.index["ArticleKey"].ranked(key, limit + len(self.delta.dead))
+        alive = ~np.isin(rows, self.delta.dead)
+        added, added_ranks = self.delta.index["ArticleKey"].ranked(key, limit)
+        rows = np.concatenate((rows[alive][:limit], added + self.delta.offset))
+        ranks = np.concatenate((ranks[alive][:limit], added_ranks))
+        return rows[np.lexsort((rows, -ranks))[:limit]]
+
+    def article_keys(self) -> tuple:
+        """(нормалізовані ключі, номери рядків) усіх живих рядків із ключем"""
+        articles = self.index["ArticleKey"]
+        if self.delta is None:
+            return articles.keys.tolist(), articles.rows
+        alive = ~np.isin(articles.rows, self.delta.dead)
+        added = self.delta.index["ArticleKey"]
+        keys = np.array(articles.keys.tolist(), dtype=object)[alive].tolist() + added.keys.tolist()
+        return keys, np.concatenate((articles.rows[alive].astype(np.int64), added.rows.astype(np.int64) + self.delta.offset))
+
+    def card_values(self, pos: int) -> tuple:
+        if self.delta is not None and pos >= self.delta.offset:
+            return self.delta.table.card_values(pos - self.delta.offset)
+        return self.table.card_values(pos)
+
+    def take(self, col: str, rows: np.ndarray) -> list:
+        """CompactTable.take для номерів рядків знімка разом зі змінами"""
+        if self.delta is None:
+            return self.table.take(col, rows)
+        added = rows >= self.delta.offset
+        values = np.empty(len(rows), dtype=object)
+        values[~added] = self.table.take(col, rows[~added])
+        values[added] = self.delta.table.take(col, rows[added] - self.delta.offset)
+        return values.tolist()
+
+    def footprint(self) -> dict:
+        """Пам'ять таблиці, індексів і готових карток, байти (таблиця й індекси рахуються один раз)"""
+        if self.memory is None:
+            self.memory = {"table": self.table.nbytes(), "index": index_nbytes(self.index)}
+            if self.delta is not None:
+                self.memory["table"] += self.delta.table.nbytes()
+                self.memory["index"] += index_nbytes(self.delta.index) + self.delta.dead.nbytes
+        return {**self.memory, "cards": self.cards_bytes}
+
+    def warm_up(self):
+        """Усе, що рахується по всій таблиці, — наперед, поза циклом подій:
+        відбиток для токенів кнопок і розмір таблиці й індексів для /perf і метрик"""
+        self.fingerprint
+        self.footprint()
+
+    def card(self, pos: int, lang: str = "uk") -> str:
+        cards = self.cards.get(lang)
+        if cards is None:
+            cards = self.cards[lang] = {}
+        text = cards.get(pos)
+        if text is None:
+            text = cards[pos] = card_template(lang).format(*self.card_values(pos))
+            self.cards_bytes += sys.getsizeof(text)
+        return text
+
+# Змінювати при будь-якій зміні load_dataframe чи структури індексів
+SNAPSHOT_FORMAT = 8
+# Вирівнювання буферів масивів у файлі знімка
+SNAPSHOT_ALIGN = 64
+
+def snapshot_path(path: str) -> str:
+    return path + ".snapshot.pkl"
+
+def file_sha256(path: str) -> str:
+    """Хеш вмісту бази; для теки — імена й вміст усіх її книг"""
+    digest = hashlib.sha256()
+    for book in workbook_paths(path):
+        if book != path:
+            digest.update(os.path.basename(book).encode() + b"\0")
+        with open(book, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+def source_stat(path: str) -> os.stat_result:
+    """os.stat бази; для теки — найпізніший mtime (теки чи книги) і сумарний розмір книг,
+    тож додана, прибрана чи змінена книга теж помітна як зміна бази"""
+    stat = os.stat(path)
+    if not os.path.isdir(path):
+        return stat
+    books = [os.stat(book) for book in workbook_paths(path)]
+    mtime = max([stat.st_mtime] + [book.st_mtime for book in books])
+    return os.stat_result((stat.st_mode, 0, 0, 0, 0, 0, sum(book.st_size for book in books), mtime, mtime, mtime))
+
+def load_snapshot(path: str, stat: os.stat_result):
+    """Повертає (таблиця, індекс) зі знімка або None, якщо знімка немає чи він застарів"""
     try:
-        df["Year"] = df["Year"].apply(lambda x: int(x) if pd.notna(x) and str(x).strip() != "" else "")
+        with open(snapshot_path(path), "rb") as f:
+            meta = pickle.load(f)
+            if meta["format"] != SNAPSHOT_FORMAT:
+                return None
+            # mtime міг змінитись від копіювання — тоді вирішує хеш вмісту
+            if (meta["mtime"], meta["size"]) != (stat.st_mtime, stat.st_size):
+                if meta["sha256"] != file_sha256(path):
+                    return None
+            return map_snapshot(f)
     except Exception:
-        pass
-    for col in ["Article", "Version", "Dataset", "Model", "Region", "Unit"]:
+        return None
+
+def map_snapshot(f) -> tuple:
+    """(таблиця, індекс) з відкритого файлу знімка, одразу після метаданих.
+    Масиви й рядкові буфери не копіюються в пам'ять процесу: це відображення файлу через mmap
+    лише для читання, тож усі процеси, що відкрили той самий знімок, ділять одні сторінки"""
+    body, sizes = pickle.load(f)
+    start = f.tell()
+    mapped = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    buffers = []
+    for size in sizes:
+        start += -start % SNAPSHOT_ALIGN
+        buffers.append(mapped[start:start + size])
+        start += size
+    return pickle.loads(body, buffers=buffers)
+
+def open_snapshot(target: str) -> tuple:
+    """Знімок без перевірки на актуальність — для процесів, яким його вказав основний"""
+    with open(target, "rb") as f:
+        pickle.load(f)
+        return map_snapshot(f)
+
+def save_snapshot(path: str, stat: os.stat_result, table: CompactTable, index: dict) -> bool:
+    """Файл знімка: метадані, потік pickle без великих буферів, далі самі буфери (вирівняні)"""
+    meta = {
+        "format": SNAPSHOT_FORMAT,
+        "mtime": stat.st_mtime,
+        "size": stat.st_size,
+        "sha256": file_sha256(path),
+    }
+    target = snapshot_path(path)
+    tmp = f"{target}.{os.getpid()}.tmp"
+    try:
+        buffers = []
+        body = pickle.dumps((table, index), protocol=5, buffer_callback=buffers.append)
+        buffers = [buffer.raw() for buffer in buffers]
+        with open(tmp, "wb") as f:
+            pickle.dump(meta, f, protocol=5)
+            pickle.dump((body, [buffer.nbytes for buffer in buffers]), f, protocol=5)
+            for buffer in buffers:
+                f.write(bytes(-f.tell() % SNAPSHOT_ALIGN))
+                f.write(buffer)
+        # Заміна атомарна: процеси, що відобразили попередній знімок, і далі бачать старий файл
+        os.replace(tmp, target)
+        return True
+    except OSError:
+        logger.warning("Could not write catalogue snapshot %s", target, exc_info=True)
         try:
-            df[col] = df[col].astype(str)
-        except Exception:
+            os.remove(tmp)
+        except OSError:
             pass
-    return df
+        return False
+
+def build_catalogue(path: str = DATA_FILE, version: int = 1, strict: bool = False) -> Catalogue:
+    try:
+        stat = source_stat(path)
+    except OSError:
+        stat = None
+    cached = load_snapshot(path, stat) if SNAPSHOT_CACHE and stat is not None else None
+    image = None
+    errors = []
+    if cached is not None:
+        table, index = cached
+        image = snapshot_path(path)
+    else:
+        frame, errors = load_dataframe(path, strict=strict)
+        table = CompactTable(frame)
+        index = build_search_index(frame, table)
+        logger.info("Catalogue %s: %d rows, DataFrame %.1f MB -> compact table %.1f MB",
+                    path, len(table), table.source_nbytes / 2**20, table.nbytes() / 2**20)
+        # Порожню чи неповну таблицю (частина книг не розібралась) не кешуємо — наступний запуск спробує знову
+        if SNAPSHOT_CACHE and stat is not None and len(table) and not errors:
+            if save_snapshot(path, stat, table, index):
+                image = snapshot_path(path)
+    return Catalogue(path, table, index, stat.st_mtime if stat is not None else None, version, image,
+                     errors=tuple(errors))
+
+class LRUCache:
+    """Обмежений LRU-кеш із часом життя записів і лічильниками влучань"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is not None and item[0] < time.monotonic():
+                del self.data[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self.data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            self.data[key] = (time.monotonic() + self.ttl, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
 
-df = load_dataframe("all-in-one.xlsx")
+# Номери рядків за (версія бази, нормалізований запит)
+SEARCH_CACHE = LRUCache(CACHE_SIZE, CACHE_TTL)
+# Готовий текст сторінки за (версія бази, нормалізований запит, мова, сторінка)
+PAGE_CACHE = LRUCache(CACHE_SIZE, CACHE_TTL)
+# Готові інлайн-результати за (версія бази, ключ артикула, мова)
+INLINE_CACHE = LRUCache(CACHE_SIZE, CACHE_TTL)
+
+# Межі кошиків гістограм затримок, секунди
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """Гістограма з фіксованими кошиками: запис — bisect і три додавання"""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q: float) -> float:
+        """Верхня межа кошика, в який потрапляє квантиль q (оцінка зверху)"""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+# Час обробників ("handler") і фаз відповіді на пошук ("phase": search, render, send)
+PERF = {"handler": {}, "phase": {}}
+
+def observe(kind: str, name: str, seconds: float):
+    histogram = PERF[kind].get(name)
+    if histogram is None:
+        histogram = PERF[kind][name] = Histogram()
+    histogram.observe(seconds)
+
+@contextlib.contextmanager
+def timed(phase: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("phase", phase, time.perf_counter() - start)
+
+def instrumented(handler):
+    """Записує тривалість обробника в гістограму з його ім'ям"""
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await handler(*args, **kwargs)
+        finally:
+            observe("handler", handler.__name__, time.perf_counter() - start)
+    return wrapper
+
+def query_key(text: str) -> str:
+    """Ключ кешу: регістр не впливає на пошук, якщо запит — простий підрядок"""
+    text = text.strip()
+    return text if REGEX_SPECIAL.search(text) else text.lower()
+
+# Поточна база; читається в main() (load_catalogue), а не при імпорті модуля — процеси WorkerPool
+# і пулу читання імпортують його, але отримують знімок від основного процесу
+catalogue = None
+
+def load_catalogue() -> Catalogue:
+    """Перше завантаження бази з DATA_FILE (повторний виклик повертає вже завантажену)"""
+    global catalogue
+    if catalogue is None:
+        catalogue = build_catalogue(DATA_FILE)
+    return catalogue
+
+reload_lock = asyncio.Lock()
+
+async def reload_catalogue(path: str = None) -> Catalogue:
+    """Читає та індексує файл у фоновому потоці, потім атомарно підміняє знімок"""
+    async with reload_lock:
+        current = catalogue
+        new = await asyncio.to_thread(build_catalogue, path or current.path, current.version + 1, True)
+        if current.delta is not None and (new.path, new.mtime) == (current.path, current.mtime):
+            # Файл бази той самий — зміни, яких ще немає в знімку на диску, повторюються поверх нього
+            new = await asyncio.to_thread(replay_changes, new, current.delta.changes)
+        await install_catalogue(new)
+    logger.info("Catalogue reloaded: %s rows, version %s", new.filled_rows, new.version)
+    return new
+
+async def install_catalogue(new: Catalogue):
+    """Робить new поточною базою (викликається під reload_lock)"""
+    global catalogue
+    await asyncio.to_thread(new.warm_up)
+    if worker_pool is not None:
+        # Спершу новий знімок відображають усі процеси, потім перемикаються всі разом
+        await worker_pool.switch(new)
+    catalogue = new
+    SEARCH_CACHE.clear()
+    PAGE_CACHE.clear()
+    INLINE_CACHE.clear()
+
+async def watch_catalogue(interval: int):
+    """Перезавантажує базу, коли змінюється mtime файлу"""
+    seen = catalogue.mtime
+    failed = None
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            mtime = source_stat(catalogue.path).st_mtime
+        except OSError:
+            continue
+        if mtime == catalogue.mtime or mtime == failed:
+            continue
+        if mtime != seen:
+            # Файл міг ще дописуватись — чекаємо, поки mtime не стабілізується
+            seen = mtime
+            continue
+        try:
+            await reload_catalogue()
+        except Exception:
+            failed = mtime
+            logger.exception("Catalogue reload failed, keeping version %s", catalogue.version)
+
+# Значення колонки Action у файлі змін, що означають видалення рядка
+DELTA_DELETE = {"delete", "del", "remove", "-", "видалити"}
+# Через скільки секунд після змін записувати ущільнений знімок
+DELTA_COMPACT_DELAY = int(os.getenv("DELTA_COMPACT_DELAY", "30"))
+
+def version_keys(values) -> list:
+    """Версія як частина ключа Article+Version: без пробілів по краях, пропуск — порожній рядок"""
+    series = pd.Series(list(values), dtype=object)
+    return series.astype(str).str.strip().mask(blank_mask(series), "").tolist()
+
+def read_delta_file(name: str, data: bytes) -> pd.DataFrame:
+    """Пакет змін із файлу адміністратора (xlsx чи csv із заголовком): колонки бази
+    плюс Delete — чи рядок означає видалення (колонка Action: delete, -, видалити)"""
+    extension = name.rsplit(".", 1)[-1].lower()
+    if extension == "xlsx":
+        frame = pd.read_excel(io.BytesIO(data))
+    elif extension == "csv":
+        frame = read_csv_bytes(data, header=0)
+    else:
+        raise ValueError("очікується файл xlsx або csv")
+    missing = [col for col in ("Article", "Version") if col not in frame.columns]
+    if missing:
+        raise ValueError(f"у файлі немає колонок {', '.join(missing)}")
+    action = frame["Action"] if "Action" in frame.columns else pd.Series("", index=frame.index)
+    delete = action.astype(str).str.strip().str.lower().isin(DELTA_DELETE).to_numpy()
+    frame = prepare_frame(frame)[list(FRAME_COLUMNS)]
+    frame["Delete"] = delete
+    frame = frame[frame["ArticleKey"] != ""].reset_index(drop=True)
+    if frame.empty:
+        raise ValueError("у файлі немає рядків з артикулом")
+    return frame
+
+def apply_delta(snapshot: Catalogue, batch: pd.DataFrame) -> Catalogue:
+    """Наступна версія snapshot зі змінами batch: рядки з тими ж Article+Version замінюються
+    рядками пакета (або просто прибираються для Delete). Рядки знімка лише ховаються,
+    а індекси перебудовуються тільки для таблиці змін — вартість залежить від розміру змін, не бази"""
+    delta = snapshot.delta
+    pending = delta.frame if delta is not None else batch.iloc[:0][list(FRAME_COLUMNS)]
+    keys = set(zip(batch["ArticleKey"], version_keys(batch["Version"])))
+    hidden = [delta.dead if delta is not None else np.empty(0, dtype=np.int32)]
+    articles = snapshot.index["ArticleKey"]
+    for article in {article for article, _ in keys}:
+        rows = articles.exact(article)
+        if len(rows):
+            versions = version_keys(snapshot.table.take("Version", rows))
+            hidden.append(rows[np.array([(article, version) in keys for version in versions], dtype=bool)])
+    dead = np.unique(np.concatenate(hidden)).astype(np.int32)
+    replaced = np.array([key in keys for key in zip(pending["ArticleKey"], version_keys(pending["Version"]))], dtype=bool)
+    frame = pd.concat([pending[~replaced], batch.loc[~batch["Delete"], list(FRAME_COLUMNS)]], ignore_index=True)
+    changes = (delta.changes if delta is not None else ()) + (batch,)
+    return Catalogue(snapshot.path, snapshot.table, snapshot.index, snapshot.mtime, snapshot.version + 1,
+                     snapshot.image, Delta(len(snapshot.table), frame, dead, changes), snapshot.errors)
+
+def replay_changes(snapshot: Catalogue, changes: tuple) -> Catalogue:
+    # Повторне застосування пакета нічого не змінює, тож повторювати можна й уже враховані
+    for batch in changes:
+        snapshot = apply_delta(snapshot, batch)
+    return snapshot
+
+async def apply_catalogue_delta(batch: pd.DataFrame) -> Catalogue:
+    async with reload_lock:
+        new = await asyncio.to_thread(apply_delta, catalogue, batch)
+        await install_catalogue(new)
+    logger.info("Catalogue delta applied: %s rows in batch, version %s", len(batch), new.version)
+    return new
+
+def compact(snapshot: Catalogue):
+    """Знімок разом зі змінами як нова база: повна перебудова індексів і запис знімка на диск.
+    Повертає (таблиця, індекс, файл знімка) або None, якщо записати не вдалося"""
+    try:
+        stat = source_stat(snapshot.path)
+    except OSError:
+        return None
+    if not SNAPSHOT_CACHE or stat.st_mtime != snapshot.mtime or snapshot.errors:
+        # Без знімка на диску змінам нема куди зберегтись; змінений файл бази перечитає watch_catalogue.
+        # Неповну базу (не всі книги прочитались) на диск не пишемо, як і в build_catalogue
+        return None
+    alive = np.setdiff1d(np.arange(len(snapshot.table)), snapshot.delta.dead)
+    frame = pd.concat([snapshot.table.frame(alive), snapshot.delta.frame], ignore_index=True)
+    table = CompactTable(frame)
+    if not save_snapshot(snapshot.path, stat, table, build_search_index(frame, table)):
+        return None
+    # Ущільнена база теж відображається з файлу, як після звичайного запуску
+    image = snapshot_path(snapshot.path)
+    return (*open_snapshot(image), image)
+
+async def compact_catalogue(delay: int):
+    """Фонове ущільнення: через delay секунд після змін пише знімок бази разом зі змінами
+    і перемикається на нього. Пакети, що прийшли під час запису, повторюються поверх нового знімка"""
+    while True:
+        await asyncio.sleep(delay)
+        snapshot = catalogue
+        if snapshot.delta is None:
+            return
+        with timed("compact"):
+            compacted = await asyncio.to_thread(compact, snapshot)
+        if compacted is None:
+            logger.warning("Could not write compacted catalogue snapshot, keeping changes in memory")
+            return
+        table, index, image = compacted
+        async with reload_lock:
+            current = catalogue
+            if current.delta is None or (current.path, current.mtime) != (snapshot.path, snapshot.mtime):
+                # Поки писали, базу перечитано з файлу — ущільнене вже не потрібне
+                return
+            done = snapshot.delta.changes
+            later = current.delta.changes
+            if len(later) >= len(done) and all(a is b for a, b in zip(later, done)):
+                later = later[len(done):]
+            new = Catalogue(current.path, table, index, current.mtime, current.version + 1, image)
+            new = await asyncio.to_thread(replay_changes, new, later)
+            await install_catalogue(new)
+        logger.info("Catalogue compacted: %s rows, version %s", new.filled_rows, new.version)
+        if new.delta is None:
+            return
 
 # Функція для підрахунку заповнених рядків
 def count_filled_rows():
-    try:
-        # Рахуємо рядки, де хоча б одна комірка не пуста
-        return df.dropna(how='all').shape[0]
-    except Exception:
-        return 0
+    return catalogue.filled_rows
 
 # Функція для отримання дати модифікації файлу
-def get_file_modification_date(filename="all-in-one.xlsx"):
-    try:
-        mod_time = os.path.getmtime(filename)
-        return datetime.datetime.fromtimestamp(mod_time).strftime("%d.%m.%Y")
-    except:
+def get_file_modification_date():
+    if catalogue.mtime is None:
         return "невідомо"
+    return datetime.datetime.fromtimestamp(catalogue.mtime).strftime("%d.%m.%Y")
 
 LANGUAGES = {
     "uk": {
@@ -79,19 +1545,26 @@ LANGUAGES = {
         "nav": {
             "prev": "⬅️ Назад",
             "next": "➡️ Далі",
-            "main": "🏠 Головне меню"
+            "main": "🏠 Головне меню",
+            "filter": "🔎 Фільтр",
+            "reset": "♻️ Скинути фільтри"
         },
         "help": "ℹ️ Довідка:\nЦей телеграм-бот створений для швидкого пошуку датасетів у нашій базі даних.\nДля пошуку просто введіть артикул блоку управління або назву датасету",
         "contacts": "📞 Контакти:\nEmail: datenflash@proton.me\nTelegram: @mukich1 або @mr_muhich\nInstagram: @codiVAG",
         "choose_lang": "🌐 Оберіть мову:",
         "changed": "✅ Мову змінено на {lang}",
         "not_found": "⚠️ Нічого не знайдено.",
+        "did_you_mean": "⚠️ Нічого не знайдено. Можливо, ви мали на увазі ⤵️",
         "enter_search": "Введіть артикул блоку чи назву датасету для пошуку ⤵️",
         "empty_query": "⚠️ Ви нічого не ввели. Спробуйте ще раз ⤵️",
         "short_query": "⚠️ Запит занадто короткий. Введіть мінімум 3 символи ⤵️",
+        "results_expired": "⌛️ Результати застаріли. Повторіть пошук ⤵️",
         "back_menu": "🏠 Ви повернулися в головне меню.\nДля початку, виберіть розділ ⤵️",
         "search_ok": "✅ Знайдено результати!",
-        "page_info": "📖 Сторінка {cur} з {total}"
+        "page_info": "📖 Сторінка {cur} з {total}",
+        "bulk_ok": "📦 Знайдено {found} з {total} артикулів",
+        "bulk_empty": "⚠️ Не вдалося прочитати артикули з файлу",
+        "bulk_too_many": "⚠️ Забагато артикулів: не більше {limit} за раз"
     },
     "en": {
         "name": "English",
@@ -116,19 +1589,26 @@ LANGUAGES = {
         "nav": {
             "prev": "⬅️ Prev",
             "next": "➡️ Next",
-            "main": "🏠 Main menu"
+            "main": "🏠 Main menu",
+            "filter": "🔎 Filter",
+            "reset": "♻️ Reset filters"
         },
         "help": "ℹ️ Help:\nThis Telegram bot is designed for quick dataset search in our database.\nTo search, simply enter the control unit article number or dataset name",
         "contacts": "📞 Contacts:\nEmail: datenflash@proton.me\nTelegram: @mukich1 or @mr_muhich\nInstagram: @codiVAG",
         "choose_lang": "🌐 Choose language:",
         "changed": "✅ Language changed to {lang}",
         "not_found": "⚠️ Nothing found.",
+        "did_you_mean": "⚠️ Nothing found. Did you mean ⤵️",
         "enter_search": "Enter the article number or dataset name to search ⤵️",
         "empty_query": "⚠️ You didn't type anything. Try again ⤵️",
         "short_query": "⚠️ Query too short. Please enter at least 3 characters ⤵️",
+        "results_expired": "⌛️ These results have expired. Please search again ⤵️",
         "back_menu": "🏠 You returned to the main menu.\nPlease choose a section ⤵️",
         "search_ok": "✅ Results found!",
-        "page_info": "📖 Page {cur} of {total}"
+        "page_info": "📖 Page {cur} of {total}",
+        "bulk_ok": "📦 Found {found} of {total} articles",
+        "bulk_empty": "⚠️ Could not read any articles from the file",
+        "bulk_too_many": "⚠️ Too many articles: at most {limit} at a time"
     },
     "de": {
         "name": "Deutsch",
@@ -153,19 +1633,26 @@ LANGUAGES = {
         "nav": {
             "prev": "⬅️ Zurück",
             "next": "➡️ Weiter",
-            "main": "🏠 Hauptmenü"
+            "main": "🏠 Hauptmenü",
+            "filter": "🔎 Filter",
+            "reset": "♻️ Filter zurücksetzen"
         },
         "help": "ℹ️ Hilfe:\nDieser Telegram-Bot wurde für die schnelle Suche von Datensätzen in unserer Datenbank entwickelt.\nZur Suche geben Sie einfach die Artikelnummer oder den Datensatznamen ein",
         "contacts": "📞 Kontakte:\nEmail: datenflash@proton.me\nTelegram: @mukich1 oder @mr_muhich\nInstagram: @codiVAG",
         "choose_lang": "🌐 Sprache wählen:",
         "changed": "✅ Sprache geändert zu {lang}",
         "not_found": "⚠️ Nichts gefunden.",
+        "did_you_mean": "⚠️ Nichts gefunden. Meinten Sie ⤵️",
         "enter_search": "Geben Sie die Artikelnummer oder den Datensatznamen ein ⤵️",
         "empty_query": "⚠️ Sie haben nichts eingegeben. Bitte erneut versuchen ⤵️",
         "short_query": "⚠️ Anfrage zu kurz. Bitte mindestens 3 Zeichen eingeben ⤵️",
+        "results_expired": "⌛️ Diese Ergebnisse sind abgelaufen. Bitte erneut suchen ⤵️",
         "back_menu": "🏠 Sie sind ins Hauptmenü zurückgekehrt.\nBitte wählen Sie einen Bereich ⤵️",
         "search_ok": "✅ Ergebnisse gefunden!",
-        "page_info": "📖 Seite {cur} von {total}"
+        "page_info": "📖 Seite {cur} von {total}",
+        "bulk_ok": "📦 {found} von {total} Artikeln gefunden",
+        "bulk_empty": "⚠️ In der Datei wurden keine Artikel erkannt",
+        "bulk_too_many": "⚠️ Zu viele Artikel: höchstens {limit} auf einmal"
     },
     "fr": {
         "name": "Français",
@@ -190,19 +1677,26 @@ LANGUAGES = {
         "nav": {
             "prev": "⬅️ Précédent",
             "next": "➡️ Suivant",
-            "main": "🏠 Menu principal"
+            "main": "🏠 Menu principal",
+            "filter": "🔎 Filtrer",
+            "reset": "♻️ Réinitialiser les filtres"
         },
         "help": "ℹ️ Aide:\nCe bot Telegram est conçu pour la recherche rapide de jeux de données dans notre base.\nPour rechercher, entrez simplement le numéro de l’article ou le nom du dataset",
         "contacts": "📞 Contacts:\nEmail: datenflash@proton.me\nTelegram: @mukich1 ou @mr_muhich\nInstagram: @codiVAG",
         "choose_lang": "🌐 Choisissez une langue:",
         "changed": "✅ Langue changée en {lang}",
         "not_found": "⚠️ Rien trouvé.",
+        "did_you_mean": "⚠️ Rien trouvé. Vouliez-vous dire ⤵️",
         "enter_search": "Entrez le numéro de l’article ou le nom du dataset ⤵️",
         "empty_query": "⚠️ Vous n’avez rien saisi. Essayez encore ⤵️",
         "short_query": "⚠️ Requête trop courte. Entrez au moins 3 caractères ⤵️",
+        "results_expired": "⌛️ Ces résultats ont expiré. Relancez la recherche ⤵️",
         "back_menu": "🏠 Vous êtes retourné au menu principal.\nVeuillez choisir une section ⤵️",
         "search_ok": "✅ Résultats trouvés!",
-        "page_info": "📖 Page {cur} sur {total}"
+        "page_info": "📖 Page {cur} sur {total}",
+        "bulk_ok": "📦 {found} articles trouvés sur {total}",
+        "bulk_empty": "⚠️ Impossible de lire des articles dans le fichier",
+        "bulk_too_many": "⚠️ Trop d'articles : {limit} au maximum à la fois"
     },
     "es": {
         "name": "Español",
@@ -227,19 +1721,26 @@ LANGUAGES = {
         "nav": {
             "prev": "⬅️ Anterior",
             "next": "➡️ Siguiente",
-            "main": "🏠 Menú principal"
+            "main": "🏠 Menú principal",
+            "filter": "🔎 Filtrar",
+            "reset": "♻️ Quitar filtros"
         },
         "help": "ℹ️ Ayuda:\nEste bot de Telegram está diseñado para la búsqueda rápida de conjuntos de datos en nuestra base de datos.\nPara buscar, simplemente ingrese el número de artículo o el nombre del dataset",
         "contacts": "📞 Contactos:\nEmail: datenflash@proton.me\nTelegram: @mukich1 o @mr_muhich\nInstagram: @codiVAG",
         "choose_lang": "🌐 Elija un idioma:",
         "changed": "✅ Idioma cambiado a {lang}",
         "not_found": "⚠️ No se encontró nada.",
+        "did_you_mean": "⚠️ No se encontró nada. ¿Quiso decir ⤵️",
         "enter_search": "Ingrese el número de artículo o el nombre del dataset ⤵️",
         "empty_query": "⚠️ No escribiste nada. Intenta de nuevo ⤵️",
         "short_query": "⚠️ Consulta demasiado corta. Escribe al menos 3 caracteres ⤵️",
+        "results_expired": "⌛️ Estos resultados han caducado. Vuelve a buscar ⤵️",
         "back_menu": "🏠 Has vuelto al menú principal.\nElija una sección ⤵️",
         "search_ok": "✅ ¡Resultados encontrados!",
-        "page_info": "📖 Página {cur} de {total}"
+        "page_info": "📖 Página {cur} de {total}",
+        "bulk_ok": "📦 Encontrados {found} de {total} artículos",
+        "bulk_empty": "⚠️ No se pudieron leer artículos del archivo",
+        "bulk_too_many": "⚠️ Demasiados artículos: máximo {limit} a la vez"
     },
     "it": {
         "name": "Italiano",
@@ -264,19 +1765,26 @@ LANGUAGES = {
         "nav": {
             "prev": "⬅️ Indietro",
             "next": "➡️ Avanti",
-            "main": "🏠 Menu principale"
+            "main": "🏠 Menu principale",
+            "filter": "🔎 Filtra",
+            "reset": "♻️ Rimuovi filtri"
         },
         "help": "ℹ️ Guida:\nQuesto bot Telegram è stato creato per cercare rapidamente dataset nel nostro database.\nPer cercare, inserisci semplicemente il numero dell’articolo o il nome del dataset",
         "contacts": "📞 Contatti:\nEmail: datenflash@proton.me\nTelegram: @mukich1 o @mr_muhich\nInstagram: @codiVAG",
         "choose_lang": "🌐 Seleziona la lingua:",
         "changed": "✅ Lingua cambiata in {lang}",
         "not_found": "⚠️ Nessun risultato trovato.",
+        "did_you_mean": "⚠️ Nessun risultato trovato. Forse intendevi ⤵️",
         "enter_search": "Inserisci il numero dell’articolo o il nome del dataset ⤵️",
         "empty_query": "⚠️ Non hai digitato nulla. Riprova ⤵️",
         "short_query": "⚠️ Query troppo corta. Inserisci almeno 3 caratteri ⤵️",
+        "results_expired": "⌛️ Questi risultati sono scaduti. Ripeti la ricerca ⤵️",
         "back_menu": "🏠 Sei tornato al menu principale.\nSeleziona una sezione ⤵️",
         "search_ok": "✅ Risultati trovati!",
-        "page_info": "📖 Pagina {cur} di {total}"
+        "page_info": "📖 Pagina {cur} di {total}",
+        "bulk_ok": "📦 Trovati {found} articoli su {total}",
+        "bulk_empty": "⚠️ Impossibile leggere articoli dal file",
+        "bulk_too_many": "⚠️ Troppi articoli: al massimo {limit} alla volta"
     },
     "pt": {
         "name": "Português",
@@ -301,19 +1809,26 @@ LANGUAGES = {
         "nav": {
             "prev": "⬅️ Anterior",
             "next": "➡️ Próximo",
-            "main": "🏠 Menu principal"
+            "main": "🏠 Menu principal",
+            "filter": "🔎 Filtrar",
+            "reset": "♻️ Limpar filtros"
         },
         "help": "ℹ️ Ajuda:\nEste bot do Telegram foi criado para pesquisa rápida de conjuntos de dados no nosso banco de dados.\nPara pesquisar, basta inserir o número do artigo ou o nome do dataset",
         "contacts": "📞 Contatos:\nEmail: datenflash@proton.me\nTelegram: @mukich1 ou @mr_muhich\nInstagram: @codiVAG",
         "choose_lang": "🌐 Escolha o idioma:",
         "changed": "✅ Idioma alterado para {lang}",
         "not_found": "⚠️ Nada encontrado.",
+        "did_you_mean": "⚠️ Nada encontrado. Você quis dizer ⤵️",
         "enter_search": "Digite o número do artigo ou o nome do dataset ⤵️",
         "empty_query": "⚠️ Você não digitou nada. Tente novamente ⤵️",
         "short_query": "⚠️ Consulta muito curta. Digite pelo menos 3 caracteres ⤵️",
+        "results_expired": "⌛️ Estes resultados expiraram. Pesquise novamente ⤵️",
         "back_menu": "🏠 Você voltou ao menu principal.\nEscolha uma seção ⤵️",
         "search_ok": "✅ Resultados encontrados!",
-        "page_info": "📖 Página {cur} de {total}"
+        "page_info": "📖 Página {cur} de {total}",
+        "bulk_ok": "📦 Encontrados {found} de {total} artigos",
+        "bulk_empty": "⚠️ Não foi possível ler artigos do arquivo",
+        "bulk_too_many": "⚠️ Artigos demais: no máximo {limit} de cada vez"
     },
     "pl": {
         "name": "Polski",
@@ -338,19 +1853,26 @@ LANGUAGES = {
         "nav": {
             "prev": "⬅️ Wstecz",
             "next": "➡️ Dalej",
-            "main": "🏠 Menu główne"
+            "main": "🏠 Menu główne",
+            "filter": "🔎 Filtruj",
+            "reset": "♻️ Wyczyść filtry"
         },
         "help": "ℹ️ Pomoc:\nTen bot Telegram został stworzony do szybkiego wyszukiwania zestawów danych w naszej bazie.\nAby wyszukać, po prostu wprowadź numer artykułu lub nazwę zestawu danych",
         "contacts": "📞 Kontakty:\nEmail: datenflash@proton.me\nTelegram: @mukich1 lub @mr_muhich\nInstagram: @codiVAG",
         "choose_lang": "🌐 Wybierz język:",
         "changed": "✅ Język zmieniony na {lang}",
         "not_found": "⚠️ Nic nie znaleziono.",
+        "did_you_mean": "⚠️ Nic nie znaleziono. Czy chodziło o ⤵️",
         "enter_search": "Wprowadź numer artykułu lub nazwę zestawu danych ⤵️",
         "empty_query": "⚠️ Nie wprowadziłeś nic. Spróbuj ponownie ⤵️",
         "short_query": "⚠️ Zapytanie zbyt krótkie. Wprowadź co najmniej 3 znaki ⤵️",
+        "results_expired": "⌛️ Te wyniki wygasły. Wyszukaj ponownie ⤵️",
         "back_menu": "🏠 Wróciłeś do menu głównego.\nWybierz sekcję ⤵️",
         "search_ok": "✅ Znaleziono wyniki!",
-        "page_info": "📖 Strona {cur} z {total}"
+        "page_info": "📖 Strona {cur} z {total}",
+        "bulk_ok": "📦 Znaleziono {found} z {total} artykułów",
+        "bulk_empty": "⚠️ Nie udało się odczytać artykułów z pliku",
+        "bulk_too_many": "⚠️ Za dużo artykułów: maksymalnie {limit} naraz"
     },
     "tr": {
         "name": "Türkçe",
@@ -375,19 +1897,26 @@ LANGUAGES = {
         "nav": {
             "prev": "⬅️ Geri",
             "next": "➡️ İleri",
-            "main": "🏠 Ana menü"
+            "main": "🏠 Ana menü",
+            "filter": "🔎 Filtrele",
+            "reset": "♻️ Filtreleri sıfırla"
         },
         "help": "ℹ️ Yardım:\nBu Telegram botu, veritabanımızdaki veri setlerini hızlı bir şekilde aramak için tasarlanmıştır.\nAramak için kontrol ünitesi makale numarasını veya veri seti adını girin",
         "contacts": "📞 İletişim:\nEmail: datenflash@proton.me\nTelegram: @mukich1 veya @mr_muhich\nInstagram: @codiVAG",
         "choose_lang": "🌐 Dil seçin:",
         "changed": "✅ Dil {lang} olarak değiştirildi",
         "not_found": "⚠️ Hiçbir şey bulunamadı.",
+        "did_you_mean": "⚠️ Hiçbir şey bulunamadı. Bunu mu demek istediniz ⤵️",
         "enter_search": "Aramak için makale numarasını veya veri seti adını girin ⤵️",
         "empty_query": "⚠️ Hiçbir şey yazmadınız. Tekrar deneyin ⤵️",
         "short_query": "⚠️ Sorgu çok kısa. Lütfen en az 3 karakter girin ⤵️",
+        "results_expired": "⌛️ Bu sonuçların süresi doldu. Lütfen yeniden arayın ⤵️",
         "back_menu": "🏠 Ana menüye döndünüz.\nLütfen bir bölüm seçin ⤵️",
         "search_ok": "✅ Sonuçlar bulundu!",
-        "page_info": "📖 Sayfa {cur} / {total}"
+        "page_info": "📖 Sayfa {cur} / {total}",
+        "bulk_ok": "📦 {total} parçadan {found} tanesi bulundu",
+        "bulk_empty": "⚠️ Dosyadan parça numarası okunamadı",
+        "bulk_too_many": "⚠️ Çok fazla parça numarası: en fazla {limit}"
     },
     "zh": {
         "name": "中文",
@@ -412,19 +1941,26 @@ LANGUAGES = {
         "nav": {
             "prev": "⬅️ 上一页",
             "next": "➡️ 下一页",
-            "main": "🏠 主菜单"
+            "main": "🏠 主菜单",
+            "filter": "🔎 筛选",
+            "reset": "♻️ 清除筛选"
         },
         "help": "ℹ️ 帮助:\n这个Telegram机器人用于快速搜索我们数据库中的数据集。\n要搜索，只需输入控制单元文章编号或数据集名称",
         "contacts": "📞 联系方式:\nEmail: datenflash@proton.me\nTelegram: @mukich1 或 @mr_muhich\nInstagram: @codiVAG",
         "choose_lang": "🌐 选择语言:",
         "changed": "✅ 语言已更改为 {lang}",
         "not_found": "⚠️ 未找到任何内容。",
+        "did_you_mean": "⚠️ 未找到任何内容。您是不是要找 ⤵️",
         "enter_search": "输入文章编号或数据集名称进行搜索 ⤵️",
         "empty_query": "⚠️ 您没有输入任何内容。请重试 ⤵️",
         "short_query": "⚠️ 查询太短。请输入至少3个字符 ⤵️",
+        "results_expired": "⌛️ 这些结果已过期。请重新搜索 ⤵️",
         "back_menu": "🏠 您已返回主菜单。\n请选择一个部分 ⤵️",
         "search_ok": "✅ 找到结果！",
-        "page_info": "📖 第 {cur} 页，共 {total} 页"
+        "page_info": "📖 第 {cur} 页，共 {total} 页",
+        "bulk_ok": "📦 共 {total} 个零件号，找到 {found} 个",
+        "bulk_empty": "⚠️ 无法从文件中读取零件号",
+        "bulk_too_many": "⚠️ 零件号过多：每次最多 {limit} 个"
     },
     "ar": {
         "name": "العربية",
@@ -449,19 +1985,26 @@ LANGUAGES = {
         "nav": {
             "prev": "⬅️ السابق",
             "next": "➡️ التالي",
-            "main": "🏠 القائمة الرئيسية"
+            "main": "🏠 القائمة الرئيسية",
+            "filter": "🔎 تصفية",
+            "reset": "♻️ إعادة ضبط التصفية"
         },
         "help": "ℹ️ المساعدة:\nتم تصميم هذا البوت للبحث السريع عن مجموعات البيانات في قاعدة البيانات الخاصة بنا.\nللبحث، ما عليك سوى إدخال رقم المادة أو اسم مجموعة البيانات",
         "contacts": "📞 جهات الاتصال:\nEmail: datenflash@proton.me\nTelegram: @mukich1 أو @mr_muhich\nInstagram: @codiVAG",
         "choose_lang": "🌐 اختر اللغة:",
         "changed": "✅ تم تغيير اللغة إلى {lang}",
         "not_found": "⚠️ لم يتم العثور على شيء.",
+        "did_you_mean": "⚠️ لم يتم العثور على شيء. هل تقصد ⤵️",
         "enter_search": "أدخل رقم المادة أو اسم مجموعة البيانات للبحث ⤵️",
         "empty_query": "⚠️ لم تدخل أي شيء. حاول مرة أخرى ⤵️",
         "short_query": "⚠️ الاستعلام قصير جدًا. يرجى إدخال 3 أحرف على الأقل ⤵️",
+        "results_expired": "⌛️ انتهت صلاحية هذه النتائج. يرجى البحث مرة أخرى ⤵️",
         "back_menu": "🏠 لقد عدت إلى القائمة الرئيسية.\nيرجى اختيار قسم ⤵️",
         "search_ok": "✅ تم العثور على نتائج!",
-        "page_info": "📖 الصفحة {cur} من {total}"
+        "page_info": "📖 الصفحة {cur} من {total}",
+        "bulk_ok": "📦 تم العثور على {found} من {total} رقم قطعة",
+        "bulk_empty": "⚠️ تعذرت قراءة أرقام القطع من الملف",
+        "bulk_too_many": "⚠️ عدد كبير جدًا: {limit} كحد أقصى في المرة الواحدة"
     }
 }  # ⚠️ вставити повний словник з 7 мовами
 
@@ -515,32 +2058,537 @@ def render_result(row, lang="uk"):
         f"{labels['unit']} {clean(row['Unit'])}"
     )
 
-def render_page(results: pd.DataFrame, page: int, lang="uk", per_page: int = 5) -> str:
+CARD_TEMPLATES = {}
+
+def card_template(lang="uk") -> str:
+    """Шаблон картки з підписами мови; значення підставляються через format"""
+    template = CARD_TEMPLATES.get(lang)
+    if template is None:
+        labels = LANGUAGES[lang]["labels"]
+        template = CARD_TEMPLATES[lang] = "\n".join(
+            labels[label].replace("{", "{{").replace("}", "}}") + " {}" for _, label in CARD_FIELDS
+        )
+    return template
+
+def render_page(snapshot: Catalogue, rows: np.ndarray, page: int, lang="uk", per_page: int = 5,
+                more: bool = False) -> str:
     start = page * per_page
-    end = min(start + per_page, len(results))
-    subset = results.iloc[start:end]
-    parts = []
-    for i, (_, row) in enumerate(subset.iterrows(), start=start+1):
-        parts.append(f"🔹 *{i}*\n{render_result(row, lang)}")
+    end = min(start + per_page, len(rows))
+    parts = [
+        f"🔹 *{i}*\n{snapshot.card(pos, lang)}"
+        for i, pos in enumerate(rows[start:end].tolist(), start=start+1)
+    ]
     text = "\n\n".join(parts)
-    total_pages = (len(results) + per_page - 1) // per_page
-    text += f"\n\n{LANGUAGES[lang]['page_info'].format(cur=page+1, total=total_pages)}"
+    total_pages = (len(rows) + per_page - 1) // per_page
+    # Видача обрізана на SEARCH_LIMIT — точна кількість невідома
+    total = f"{total_pages}+" if more else total_pages
+    text += f"\n\n{LANGUAGES[lang]['page_info'].format(cur=page+1, total=total)}"
+    return text
+
+def truncated(key: tuple) -> bool:
+    """Чи є збіги за межами видачі: повна видача має ключ без обмеження (див. search_result)"""
+    return key[2] is not None
+
+def search_result(key: tuple, rows: np.ndarray) -> tuple:
+    """(ключ, рядки) для показу з кешованих рядків. З обмеженням шукається limit + 1 рядок:
+    зайвий лише показує, що є ще збіги. Якщо його немає, видача повна, і ключ — без обмеження,
+    тож сторінки в PAGE_CACHE спільні з видачею без обмеження"""
+    limit = key[2]
+    if limit is not None and len(rows) > limit:
+        return key, rows[:limit]
+    return (*key[:2], None), rows
+
+def cached_page(snapshot: Catalogue, rows: np.ndarray, key: tuple, page: int, lang="uk") -> str:
+    """render_page через спільний кеш; key — (версія бази, нормалізований запит, обмеження)"""
+    cache_key = (*key, lang, page)
+    text = PAGE_CACHE.get(cache_key)
+    if text is None:
+        text = render_page(snapshot, rows, page, lang, more=truncated(key))
+        PAGE_CACHE.put(cache_key, text)
     return text
 
-def results_nav_keyboard(lang, page, total_items, per_page: int = 5):
+def find_rows(snapshot: Catalogue, text: str, limit: int = SEARCH_LIMIT) -> tuple:
+    """Номери рядків знімка через спільний кеш; повертає (ключ, рядки).
+    limit=None — усі збіги, а не лише перші SEARCH_LIMIT"""
+    key = (snapshot.version, query_key(text), limit)
+    rows = SEARCH_CACHE.get(key)
+    if rows is None:
+        rows = snapshot.search(text, limit + 1 if limit is not None else None)
+        rows.flags.writeable = False
+        SEARCH_CACHE.put(key, rows)
+    return search_result(key, rows)
+
+def apply_filters(snapshot: Catalogue, rows: np.ndarray, filters: tuple) -> np.ndarray:
+    """Звужує rows фільтрами ((номер у FACET_FIELDS, код значення), ...)"""
+    for field, code in filters:
+        rows = snapshot.facets.refine(rows, FACET_FIELDS[field][0], code)
+    return rows
+
+def worker_snapshot(image: str, path: str, version: int, delta: Delta = None) -> Catalogue:
+    if image is None:
+        # Знімок на диску вимкнено (SNAPSHOT_CACHE=0) — процес читає файл бази сам
+        snapshot = build_catalogue(path, version)
+        table, index = snapshot.table, snapshot.index
+    else:
+        table, index = open_snapshot(image)
+    return Catalogue(path, table, index, None, version, image, delta)
+
+def worker_main(conn):
+    """Цикл процесу WorkerPool: завдання з каналу виконуються по черзі, відповідь — (номер, успіх, результат)"""
+    snapshots = {}
+    while True:
+        try:
+            job, kind, args = conn.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            image, path, version, layered = args[:4]
+            snapshot = snapshots.get(version)
+            if snapshot is None:
+                if layered and kind != "load":
+                    # Зміни поверх знімка приходять лише із завданням load — без них відповідь була б хибною
+                    raise LookupError(f"catalogue version {version} is not loaded")
+                snapshot = snapshots[version] = worker_snapshot(image, path, version, args[4] if layered else None)
+                # Попередня версія ще потрібна завданням, надісланим до перемикання
+                for old in [v for v in snapshots if v < version - 1]:
+                    del snapshots[old]
+            if kind == "load":
+                result = version
+            elif kind == "search":
+                result = snapshot.search(*args[4:])
+            elif kind == "suggest":
+                result = snapshot.suggest(args[4])
+            else:
+                raise ValueError(f"unknown job {kind}")
+            conn.send((job, True, result))
+        except Exception as e:
+            conn.send((job, False, RuntimeError(f"{type(e).__name__}: {e}")))
+
+class WorkerPool:
+    """Процеси для пошуку й підказок (SEARCH_EXECUTOR=process), щоб не впиратись у GIL.
+    Усі процеси відображають той самий файл знімка через mmap лише для читання, тож таблиця
+    й індекси лежать у пам'яті один раз. Кожне завдання несе версію бази; при перезавантаженні
+    switch() чекає, поки новий знімок відкриють усі процеси, і лише потім основний перемикається"""
+
+    def __init__(self, size: int):
+        self.context = multiprocessing.get_context("spawn")
+        self.size = size
+        self.processes = [None] * size
+        self.conns = [None] * size
+        # Для кожного процесу: номер завдання -> future
+        self.pending = [{} for _ in range(size)]
+        self.jobs = itertools.count()
+        self.loop = None
+        self.closing = False
+        self.current = None
+
+    def start(self, snapshot: Catalogue):
+        if snapshot.image is None:
+            logger.warning("No catalogue snapshot on disk, every worker process will load %s itself", snapshot.path)
+        self.current = snapshot
+        for i in range(self.size):
+            self.spawn(i)
+
+    def spawn(self, i: int):
+        parent, child = self.context.Pipe()
+        process = self.context.Process(target=worker_main, args=(child,), name=f"search-{i}", daemon=True)
+        process.start()
+        child.close()
+        self.processes[i] = process
+        self.conns[i] = parent
+        self.pending[i] = {}
+        # Перше завдання — відкрити поточний знімок; відповідь на нього ніхто не чекає
+        parent.send((next(self.jobs), "load", self.job_args(self.current, self.current.delta)))
+        threading.Thread(target=self.receive, args=(i, parent), name=f"search-{i}-reader", daemon=True).start()
+
+    def job_args(self, snapshot: Catalogue, *args) -> tuple:
+        """Файл знімка, версія і чи є зміни поверх нього (самі зміни передає лише load)"""
+        return (snapshot.image, snapshot.path, snapshot.version, snapshot.delta is not None, *args)
+
+    def receive(self, i: int, conn):
+        """Потік читання відповідей одного процесу; результати передаються в цикл подій"""
+        while True:
+            try:
+                job, ok, result = conn.recv()
+            except (EOFError, OSError):
+                break
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(self.resolve, self.pending[i], job, ok, result)
+        if self.loop is not None and not self.closing:
+            self.loop.call_soon_threadsafe(self.lost, i, conn)
+
+    def resolve(self, pending: dict, job: int, ok: bool, result):
+        future = pending.pop(job, None)
+        if future is None or future.done():
+            return
+        if ok:
+            future.set_result(result)
+        else:
+            future.set_exception(result)
+
+    def lost(self, i: int, conn):
+        if self.closing or self.conns[i] is not conn:
+            return
+        self.processes[i].join(timeout=1)
+        logger.error("Worker process %s exited with code %s, restarting", i, self.processes[i].exitcode)
+        for future in self.pending[i].values():
+            if not future.done():
+                future.set_exception(RuntimeError("worker process exited"))
+        self.spawn(i)
+
+    def submit(self, kind: str, args: tuple, worker: int = None) -> asyncio.Future:
+        self.loop = asyncio.get_running_loop()
+        if worker is None:
+            # Найменш завантажений процес
+            worker = min(range(self.size), key=lambda i: len(self.pending[i]))
+        job = next(self.jobs)
+        future = self.loop.create_future()
+        self.pending[worker][job] = future
+        self.conns[worker].send((job, kind, args))
+        return future
+
+    async def run(self, kind: str, snapshot: Catalogue, args: tuple, fallback):
+        """Завдання в процесі; якщо процес не відповів як слід — те саме в потоці основного процесу"""
+        try:
+            return await self.submit(kind, self.job_args(snapshot, *args))
+        except Exception:
+            logger.warning("Worker %s job failed, running it in-process", kind, exc_info=True)
+            return await asyncio.to_thread(fallback)
+
+    async def switch(self, snapshot: Catalogue):
+        """Відкриває snapshot в усіх процесах; повертається, коли кожен підтвердив"""
+        results = await asyncio.gather(
+            *(self.submit("load", self.job_args(snapshot, snapshot.delta), worker=i) for i in range(self.size)),
+            return_exceptions=True,
+        )
+        for i, result in enumerate(results):
+            if isinstance(result, Exception):
+                logger.error("Worker process %s could not open catalogue version %s: %s", i, snapshot.version, result)
+        self.current = snapshot
+
+    def stop(self):
+        self.closing = True
+        for conn in self.conns:
+            if conn is not None:
+                conn.close()
+        for process in self.processes:
+            if process is not None:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+
+search_executor = None
+worker_pool = None
+
+def start_executor():
+    global search_executor, worker_pool
+    if SEARCH_EXECUTOR == "thread":
+        search_executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="search")
+    elif SEARCH_EXECUTOR == "process":
+        worker_pool = WorkerPool(SEARCH_WORKERS)
+        worker_pool.start(catalogue)
+
+def stop_executor():
+    global search_executor, worker_pool
+    if search_executor is not None:
+        search_executor.shutdown(wait=False, cancel_futures=True)
+        search_executor = None
+    if worker_pool is not None:
+        worker_pool.stop()
+        worker_pool = None
+
+async def run_search(snapshot: Catalogue, text: str, limit: int = SEARCH_LIMIT) -> tuple:
+    """find_rows, але сам пошук при промаху кешу виконується в пулі, а не в циклі подій"""
+    if search_executor is None and worker_pool is None:
+        return find_rows(snapshot, text, limit)
+    key = (snapshot.version, query_key(text), limit)
+    rows = SEARCH_CACHE.get(key)
+    if rows is None:
+        fetch = limit + 1 if limit is not None else None
+        if worker_pool is not None:
+            rows = await worker_pool.run("search", snapshot, (text, fetch),
+                                         functools.partial(snapshot.search, text, fetch))
+        else:
+            loop = asyncio.get_running_loop()
+            rows = await loop.run_in_executor(search_executor, snapshot.search, text, fetch)
+        rows.flags.writeable = False
+        SEARCH_CACHE.put(key, rows)
+    return search_result(key, rows)
+
+async def run_suggest(snapshot: Catalogue, text: str) -> list:
+    """Підказки для запиту без результатів; з WorkerPool — у процесі пулу"""
+    if worker_pool is None:
+        return snapshot.suggest(text)
+    return await worker_pool.run("suggest", snapshot, (text,), functools.partial(snapshot.suggest, text))
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Паралельна обробка оновлень: різні чати — одночасно, один чат — по черзі"""
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # chat_id -> [замок, кількість оновлень цього чату в роботі]
+        self.chat_locks = {}
+
+    async def do_process_update(self, update, coroutine):
+        owner = None
+        # Інлайн-запити не впорядковуємо: застарілі відкидає inline_search
+        if isinstance(update, Update) and update.inline_query is None:
+            owner = update.effective_chat or update.effective_user
+        if owner is None:
+            await coroutine
+            return
+        entry = self.chat_locks.get(owner.id)
+        if entry is None:
+            entry = self.chat_locks[owner.id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self.chat_locks[owner.id]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+# Пріоритети вихідних запитів: менше — раніше
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+class SendScheduler(BaseRateLimiter):
+    """Черга вихідних запитів до Bot API: глобальний ліміт і ліміт на чат, пріоритети, повтор після 429
+
+    Кожен чат має власне відро токенів (SEND_BURST поспіль, далі SEND_CHAT_RATE / SEND_GROUP_RATE
+    на секунду), а спільне відро на SEND_RATE розподіляється за пріоритетом: відповіді на пошук і
+    пагінація випереджають файли експорту (rate_limit_args={"priority": PRIORITY_BULK}).
+    Запити без chat_id (answerCallbackQuery, answerInlineQuery, setWebhook) ідуть одразу.
+    """
+
+    def __init__(self, rate: float, chat_rate: float, group_rate: float, burst: int, retries: int):
+        self.rate = rate
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.burst = burst
+        self.retries = retries
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        # Купа (пріоритет, порядковий номер, future) запитів, що чекають спільного токена
+        self.waiting = []
+        self.order = itertools.count()
+        self.wakeup = asyncio.Event()
+        # chat_id -> [токени, час оновлення, пауза до]
+        self.chats = {}
+        self.dispatcher = None
+        self.retried = 0
+
+    async def initialize(self):
+        if self.dispatcher is None:
+            self.dispatcher = asyncio.create_task(self.dispatch())
+
+    async def shutdown(self):
+        if self.dispatcher is not None:
+            self.dispatcher.cancel()
+            self.dispatcher = None
+        for _, _, future in self.waiting:
+            future.cancel()
+        self.waiting.clear()
+
+    def chat_delay(self, chat_id) -> float:
+        """Бере токен чату в борг і повертає, скільки треба зачекати (порядок у чаті зберігається)"""
+        now = time.monotonic()
+        if len(self.chats) > 10000:
+            idle = now - self.burst / min(self.chat_rate, self.group_rate)
+            for key in [key for key, state in self.chats.items() if state[1] < idle and state[2] < now]:
+                del self.chats[key]
+        # Від'ємні chat_id та @канали — групи з суворішим лімітом
+        rate = self.chat_rate if isinstance(chat_id, int) and chat_id > 0 else self.group_rate
+        state = self.chats.get(chat_id)
+        if state is None:
+            state = self.chats[chat_id] = [float(self.burst), now, 0.0]
+        tokens = min(self.burst, state[0] + (now - state[1]) * rate) - 1
+        state[0], state[1] = tokens, now
+        return max(-tokens / rate if tokens < 0 else 0.0, state[2] - now)
+
+    async def dispatch(self):
+        """Видає спільні токени найпріоритетнішим запитам"""
+        while True:
+            while not self.waiting:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Масові запити не беруть останню чверть відра — вона лишається для інтерактивних
+            needed = 1 if self.waiting[0][0] <= PRIORITY_INTERACTIVE else 1 + self.rate / 4
+            delay = self.paused_until - now
+            if delay <= 0 and self.tokens < needed:
+                delay = (needed - self.tokens) / self.rate
+            if delay > 0:
+                # Поки чекаємо, в купу можуть потрапити пріоритетніші запити
+                await asyncio.sleep(delay)
+                continue
+            _, _, future = heapq.heappop(self.waiting)
+            if not future.done():
+                self.tokens -= 1
+                future.set_result(None)
+
+    async def acquire(self, chat_id, priority: int):
+        start = time.monotonic()
+        delay = self.chat_delay(chat_id)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiting, (priority, next(self.order), future))
+        self.wakeup.set()
+        await future
+        observe("phase", "send_queue", time.monotonic() - start)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        priority = (rate_limit_args or {}).get("priority", PRIORITY_INTERACTIVE)
+        chat_id = data.get("chat_id")
+        for attempt in itertools.count():
+            if chat_id is not None:
+                await self.acquire(chat_id, priority)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt >= self.retries:
+                    raise
+                self.retried += 1
+                retry_after = float(e.retry_after)
+                logger.warning("%s: flood control, retrying in %s s (attempt %d)", endpoint, retry_after, attempt + 1)
+                # Telegram просить зачекати — пригальмовуємо і цей чат, і всю чергу
+                until = time.monotonic() + retry_after
+                self.paused_until = max(self.paused_until, until)
+                if chat_id is None:
+                    await asyncio.sleep(retry_after)
+                else:
+                    state = self.chats.get(chat_id)
+                    if state is not None:
+                        state[2] = max(state[2], until)
+
+# Довжина підпису токена кнопки, байти (8 символів base64)
+TOKEN_SIGNATURE = 6
+# Скільки байтів запиту вміщається в токен поруч із підписом, сторінкою, відбитком бази
+# і чотирма фільтрами в межах 64 байтів callback_data
+TOKEN_QUERY_BYTES = 18
+# Довший запит токен несе як "#" + скорочений хеш, а сам запит — у LONG_QUERIES за цим хешем
+TOKEN_DIGEST = 9
+LONG_QUERIES = LRUCache(CACHE_SIZE, 86400)
+CALLBACK_KEY = hashlib.sha256((CALLBACK_SECRET or f"callback:{TOKEN or ''}").encode()).digest()
+
+def sign_token(payload: str) -> str:
+    digest = hmac.new(CALLBACK_KEY, payload.encode(), "sha256").digest()[:TOKEN_SIGNATURE]
+    return base64.urlsafe_b64encode(digest).decode()
+
+def results_token(view: str, snapshot: Catalogue, query: str, filters: tuple, page: int) -> str:
+    """callback_data кнопки результатів без стану на сервері: "~" + підпис +
+    "вид сторінка.відбиток бази.фільтри.запит". Вид: p — сторінка, f — вибір колонки
+    фільтра, c<номер> — значення колонки; фільтри — номер колонки і код значення (hex)"""
+    codes = "-".join(f"{field}{code:x}" for field, code in filters)
+    payload = f"{view}{page:x}.{snapshot.fingerprint}.{codes}.{query}"
+    return "~" + sign_token(payload) + payload
+
+def parse_results_token(data: str):
+    """(вид, колонка, сторінка, відбиток, фільтри, запит) або None, якщо підпис не збігся"""
+    size = len(sign_token(""))
+    signature, payload = data[1:1 + size], data[1 + size:]
+    # callback_data надсилає клієнт: рядки з не-ASCII compare_digest не порівнює, тож порівнюємо байти
+    if not hmac.compare_digest(signature.encode(), sign_token(payload).encode()):
+        return None
+    head, fingerprint, codes, query = payload.split(".", 3)
+    view, field = head[0], None
+    if view == "c":
+        field, head = int(head[1]), head[1:]
+    filters = tuple((int(item[0]), int(item[1:], 16)) for item in codes.split("-")) if codes else ()
+    return view, field, int(head[1:], 16), fingerprint, filters, query
+
+def token_query(query: str) -> str:
+    """Запит для токенів кнопок. Задовгий запит (чи такий, що сам починається з "#") токен
+    несе як "#" + хеш нормалізованого запиту, а запит лишається в спільному LONG_QUERIES"""
+    if len(query.encode()) <= TOKEN_QUERY_BYTES and not query.startswith("#"):
+        return query
+    digest = "#" + base64.urlsafe_b64encode(hashlib.sha256(query.encode()).digest()[:TOKEN_DIGEST]).decode()
+    LONG_QUERIES.put(digest, query)
+    return digest
+
+def token_text(query: str):
+    """Запит із токена назад; None — хеша вже немає в LONG_QUERIES (витіснений чи інший екземпляр бота)"""
+    if not query.startswith("#"):
+        return query
+    return LONG_QUERIES.get(query)
+
+def results_nav_keyboard(lang, snapshot: Catalogue, query: str, filters: tuple, page: int, total_items: int,
+                         per_page: int = 5, more: bool = False):
     total_pages = (total_items + per_page - 1) // per_page
     nav = LANGUAGES[lang]["nav"]
+    token = functools.partial(results_token, snapshot=snapshot, query=query)
     keyboard = []
     row = []
     if page > 0:
-        row.append(InlineKeyboardButton(nav["prev"], callback_data=f"res_{page-1}"))
-    if page < total_pages - 1:
-        row.append(InlineKeyboardButton(nav["next"], callback_data=f"res_{page+1}"))
+        row.append(InlineKeyboardButton(nav["prev"], callback_data=token("p", filters=filters, page=page - 1)))
+    if page < total_pages - 1 or more:
+        row.append(InlineKeyboardButton(nav["next"], callback_data=token("p", filters=filters, page=page + 1)))
+    if row:
+        keyboard.append(row)
+    row = []
+    if total_items > per_page:
+        row.append(InlineKeyboardButton(nav["filter"], callback_data=token("f", filters=filters, page=page)))
+    if filters:
+        row.append(InlineKeyboardButton(nav["reset"], callback_data=token("p", filters=(), page=0)))
     if row:
         keyboard.append(row)
     keyboard.append([InlineKeyboardButton(nav["main"], callback_data="menu")])
     return InlineKeyboardMarkup(keyboard)
 
+# Скільки найчастіших значень фасета показувати кнопками
+FACET_BUTTONS = 12
+
+def facet_label(lang, label: str) -> str:
+    # "🚙 *Модель:*" -> "🚙 Модель"
+    return LANGUAGES[lang]["labels"][label].replace("*", "").rstrip(":")
+
+def facets_keyboard(lang, snapshot: Catalogue, query: str, filters: tuple, rows: np.ndarray, page: int):
+    """Кнопки колонок, за якими ще можна звузити результати (є хоча б два різні значення)"""
+    facets = snapshot.facets
+    keyboard = [
+        [InlineKeyboardButton(facet_label(lang, label), callback_data=results_token(f"c{i}", snapshot, query, filters, page))]
+        for i, (col, label) in enumerate(FACET_FIELDS)
+        if len(facets.counts(col, rows)) > 1
+    ]
+    keyboard.append([InlineKeyboardButton(LANGUAGES[lang]["nav"]["prev"],
+                                          callback_data=results_token("p", snapshot, query, filters, page))])
+    return InlineKeyboardMarkup(keyboard)
+
+def facet_values_keyboard(lang, snapshot: Catalogue, query: str, filters: tuple, rows: np.ndarray, page: int,
+                          field: int):
+    """Найчастіші значення колонки серед результатів; кнопка веде на першу сторінку з доданим фільтром"""
+    col = FACET_FIELDS[field][0]
+    facets = snapshot.facets
+    buttons = [
+        InlineKeyboardButton(f"{facets.values[col][code]} ({count})",
+                             callback_data=results_token("p", snapshot, query, (*filters, (field, code)), 0))
+        for code, count in facets.counts(col, rows)[:FACET_BUTTONS]
+    ]
+    keyboard = [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+    keyboard.append([InlineKeyboardButton(LANGUAGES[lang]["nav"]["prev"],
+                                          callback_data=results_token("f", snapshot, query, filters, page))])
+    return InlineKeyboardMarkup(keyboard)
+
+def filtered_page(snapshot: Catalogue, rows: np.ndarray, key: tuple, filters: tuple, page: int, lang="uk") -> str:
+    """Сторінка результатів із рядком обраних фільтрів над нею"""
+    page_text = cached_page(snapshot, rows, (*key, *filters), page, lang)
+    if filters:
+        labels = [snapshot.facets.values[FACET_FIELDS[field][0]][code] for field, code in filters]
+        page_text = "🔎 " + " · ".join(labels) + "\n\n" + page_text
+    return page_text
+
+@instrumented
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     lang = get_lang(context)
     count = count_filled_rows()
@@ -548,96 +2596,134 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     start_message = LANGUAGES[lang]["start"].format(date=mod_date, count=count)
     await update.message.reply_text(start_message, reply_markup=main_menu_keyboard(lang))
 
-async def button(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    lang = get_lang(context)
-    await query.answer()
-    data = query.data
-
-    if data.startswith("res_"):
-        page = int(data.split("_")[1])
-        results = context.user_data.get("search_results")
-        if results is not None and not results.empty:
-            context.user_data["page"] = page
-            page_text = render_page(results, page, lang)
-            await query.message.edit_text(
-                page_text,
-                reply_markup=results_nav_keyboard(lang, page, len(results))
-            )
-        return
-
-    if data == "language":
-        await query.message.reply_text(LANGUAGES[lang]["choose_lang"], reply_markup=language_menu_keyboard())
-    elif data.startswith("lang_"):
-        lang = data.split("_")[1]
-        context.user_data["lang"] = lang
-        await query.message.reply_text(
-            LANGUAGES[lang]["changed"].format(lang=LANGUAGES[lang]["name"]),
-            reply_markup=main_menu_keyboard(lang)
-        )
-    elif data == "search":
-        await query.message.reply_text(LANGUAGES[lang]["enter_search"])
-    elif data == "contacts":
-        await query.message.reply_text(LANGUAGES[lang]["contacts"], reply_markup=back_to_menu_keyboard(lang))
-    elif data == "help":
-        await query.message.reply_text(LANGUAGES[lang]["help"], reply_markup=back_to_menu_keyboard(lang))
-    elif data == "menu":
-        await query.message.reply_text(LANGUAGES[lang]["back_menu"], reply_markup=main_menu_keyboard(lang))
-        await query.message.reply_text(LANGUAGES[lang]["start"], reply_markup=main_menu_keyboard(lang))
+def suggestions_keyboard(lang, articles):
+    # Кнопка підказки запускає звичайний пошук за цим артикулом
+    keyboard = [
+        [InlineKeyboardButton(article, callback_data=f"find_{article}")]
+        for article in articles
+        if len(f"find_{article}".encode()) <= 64
+    ]
+    keyboard.append([InlineKeyboardButton(LANGUAGES[lang]["menu"]["main"], callback_data="menu")])
+    return InlineKeyboardMarkup(keyboard)
 
+@instrumented
 async def search_database(update: Update, context: ContextTypes.DEFAULT_TYPE):
     lang = get_lang(context)
     text = (update.message.text or "").strip()
     if not text:
         await update.message.reply_text(LANGUAGES[lang]["empty_query"])
         return
+    lines = [line for line in text.splitlines() if line.strip()]
+    if len(lines) > 1:
+        # Кілька рядків — список артикулів, відповідь одним файлом
+        await send_bulk_results(update.message, context, lines, lang)
+        return
     if len(text) < 3:
         await update.message.reply_text(LANGUAGES[lang]["short_query"])
         return
+    await send_search_results(update.message, context, text, lang)
+
+async def send_search_results(message, context: ContextTypes.DEFAULT_TYPE, text: str, lang: str):
+    snapshot = catalogue
+    with timed("search"):
+        key, rows = await run_search(snapshot, text)
     
-    # Оновлення статистики
-    STATS["total"] += 1
-    STATS["by_lang"][lang] += 1
-    STATS["queries"][text.lower()] += 1
-
-    mask = (
-        df["Article"].str.contains(text, case=False, na=False) |
-        df["Dataset"].str.contains(text, case=False, na=False)
-    )
-    results = df[mask].reset_index(drop=True)
-    
-    if not results.empty:
+    if len(rows):
         # Успішний пошук
-        STATS["success"] += 1
-        STATS["success_queries"].append({
-            "query": text,
-            "lang": lang,
-            "timestamp": pd.Timestamp.now(),
-            "results_count": len(results)
-        })
+        QUERY_LOG.add(text, lang, len(rows))
+        STATS.add(text, lang, len(rows))
         
-        context.user_data["search_results"] = results
-        context.user_data["page"] = 0
-        page_text = render_page(results, 0, lang)
-        await update.message.reply_text(
-            LANGUAGES[lang]["search_ok"] + "\n\n" + page_text,
-            reply_markup=results_nav_keyboard(lang, 0, len(results))
-        )
+        with timed("render"):
+            page_text = cached_page(snapshot, rows, key, 0, lang)
+        with timed("send"):
+            await message.reply_text(
+                LANGUAGES[lang]["search_ok"] + "\n\n" + page_text,
+                reply_markup=results_nav_keyboard(lang, snapshot, token_query(key[1]), (), 0, len(rows),
+                                                  more=truncated(key))
+            )
     else:
         # Неуспішний пошук
-        STATS["fail"] += 1
-        STATS["fail_queries"].append({
-            "query": text,
-            "lang": lang,
-            "timestamp": pd.Timestamp.now()
-        })
-        await update.message.reply_text(LANGUAGES[lang]["not_found"], reply_markup=main_menu_keyboard(lang))
+        QUERY_LOG.add(text, lang, 0)
+        STATS.add(text, lang, 0)
+        with timed("suggest"):
+            suggestions = await run_suggest(snapshot, text)
+        with timed("send"):
+            if suggestions:
+                await message.reply_text(LANGUAGES[lang]["did_you_mean"], reply_markup=suggestions_keyboard(lang, suggestions))
+            else:
+                await message.reply_text(LANGUAGES[lang]["not_found"], reply_markup=main_menu_keyboard(lang))
+
+# user_id -> id останнього інлайн-запиту; попередні запити користувача вже не потрібні
+INLINE_LATEST = {}
+
+def inline_results(snapshot: Catalogue, rows: np.ndarray, lang="uk") -> list:
+    results = []
+    for pos in rows.tolist():
+        article, version, dataset, model, year, region, unit = snapshot.card_values(pos)
+        results.append(InlineQueryResultArticle(
+            id=f"{snapshot.version}:{pos}",
+            title=f"{article} ({version})",
+            description=f"{dataset} · {model} · {year}",
+            input_message_content=InputTextMessageContent(snapshot.card(pos, lang)),
+        ))
+    return results
+
+@instrumented
+async def inline_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обробник інлайн-запитів: top-k артикулів за префіксом, поки користувач друкує"""
+    query = update.inline_query
+    lang = get_lang(context)
+    user_id = query.from_user.id
+    key = normalize_article(query.query)
+    INLINE_LATEST[user_id] = query.id
+    results = []
+    if len(key) >= 3:
+        if INLINE_DEBOUNCE:
+            await asyncio.sleep(INLINE_DEBOUNCE)
+        if INLINE_LATEST.get(user_id) != query.id:
+            return
+        snapshot = catalogue
+        cache_key = (snapshot.version, key, lang)
+        results = INLINE_CACHE.get(cache_key)
+        if results is None:
+            try:
+                rows = await asyncio.wait_for(
+                    asyncio.to_thread(snapshot.top, key, INLINE_LIMIT), INLINE_BUDGET
+                )
+            except asyncio.TimeoutError:
+                rows = None
+            if rows is None:
+                results = []
+            else:
+                results = inline_results(snapshot, rows, lang)
+                INLINE_CACHE.put(cache_key, results)
+        if INLINE_LATEST.get(user_id) != query.id:
+            # Поки шукали, користувач надрукував далі — відповідатиме новіший запит
+            return
+    if INLINE_LATEST.get(user_id) == query.id:
+        del INLINE_LATEST[user_id]
+    try:
+        await query.answer(results, cache_time=INLINE_CACHE_TIME if results else 0, is_personal=True)
+    except BadRequest:
+        # Запит застарів, поки ми відповідали
+        pass
+
+def top_lines(items: list, indent: str = "   ") -> str:
+    lines = []
+    for query, count in items:
+        # Зворотні лапки в запиті зламали б розмітку Markdown
+        query = query.replace("`", "'")
+        lines.append(f"{indent}• `{query}` — {count}\n")
+    return "".join(lines)
 
+@instrumented
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обробник команди /stats"""
     lang = get_lang(context)
     
-    if not STATS["total"]:
+    await QUERY_LOG.flush()
+    totals = await asyncio.to_thread(QUERY_LOG.aggregates)
+    if not totals["total"]:
         await update.message.reply_text("📊 Статистика ще порожня", reply_markup=back_to_menu_keyboard(lang))
         return
     
@@ -652,77 +2738,438 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Формування статистики
     msg = (
         f"📊 *Статистика пошуку:*\n\n"
-        f"🔎 Всього пошуків: {STATS['total']}\n"
-        f"✅ Успішних: {STATS['success']}\n"
-        f"⛔️ Неуспішних: {STATS['fail']}\n\n"
+        f"🔎 Всього пошуків: {totals['total']}\n"
+        f"✅ Успішних: {totals['success']}\n"
+        f"⛔️ Неуспішних: {totals['fail']}\n\n"
         f"🌐 За мовами:\n"
     )
     
-    for lang_code, count in STATS["by_lang"].items():
+    for lang_code, count in totals["by_lang"]:
         lang_name = LANGUAGES.get(lang_code, {}).get("name", lang_code)
         msg += f"   • {lang_name}: {count}\n"
     
-    msg += f"\n🔥 Топ-10 запитів:\n"
-    for query, count in STATS["queries"].most_common(10):
-        msg += f"   • `{query}` — {count}\n"
+    msg += (
+        f"\n🗄 Кеш пошуку: {SEARCH_CACHE.hits} влучань / {SEARCH_CACHE.misses} промахів"
+        f" ({SEARCH_CACHE.hit_rate():.0%})\n"
+        f"🗄 Кеш сторінок: {PAGE_CACHE.hits} влучань / {PAGE_CACHE.misses} промахів"
+        f" ({PAGE_CACHE.hit_rate():.0%})\n"
+    )
+
+    msg += f"\n🔥 Топ-10 запитів з моменту запуску:\n"
+    msg += top_lines(STATS.queries.top(10))
+    msg += f"\n⛔️ Топ-10 неуспішних:\n"
+    msg += top_lines(STATS.failed.top(10))
+
+    for window, title in (("hour", "За останню годину"), ("day", "За останню добу")):
+        summary = STATS.summary(window)
+        msg += (
+            f"\n🕐 *{title}:* {summary['total']} пошуків,"
+            f" ✅ {summary['success']}, ⛔️ {summary['fail']}\n"
+        )
+        if summary["by_lang"]:
+            msg += "   🌐 " + ", ".join(
+                f"{LANGUAGES.get(code, {}).get('name', code)}: {count}" for code, count in summary["by_lang"]
+            ) + "\n"
+        if summary["queries"]:
+            msg += "   🔥 Топ:\n" + top_lines(summary["queries"], "      ")
+        if summary["failed"]:
+            msg += "   ⛔️ Неуспішні:\n" + top_lines(summary["failed"], "      ")
+    
+    msg += "\n📅 Експорт за період: /export success|fail ДД.ММ.РРРР ДД.ММ.РРРР\n"
     
     await update.message.reply_text(msg, parse_mode="Markdown", reply_markup=reply_markup)
 
-async def export_data(update: Update, context: ContextTypes.DEFAULT_TYPE, data_type: str):
-    """Експорт даних у Excel"""
-    query = update.callback_query
-    await query.answer()
+def is_admin(update: Update) -> bool:
+    user = update.effective_user
+    return user is not None and user.id in ADMIN_IDS
+
+@instrumented
+async def reload_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обробник команди /reload — перечитати файл бази без перезапуску"""
+    if not is_admin(update):
+        return
+    try:
+        snapshot = await reload_catalogue()
+    except Exception as e:
+        await update.message.reply_text(f"⛔️ Не вдалося оновити базу: {e}\nПрацює версія {catalogue.version}")
+        return
+    msg = f"✅ Базу оновлено: {snapshot.filled_rows} шт. (версія {snapshot.version})"
+    if snapshot.errors:
+        msg += "\n⚠️ Не прочитано:\n" + "\n".join(f"   • {error}" for error in snapshot.errors)
+    await update.message.reply_text(msg)
+
+@instrumented
+async def delta_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обробник документа з підписом /delta — зміни бази без повного перечитування файлу.
+    Рядки файлу (xlsx чи csv) додаються або замінюють рядки з тими ж Article+Version;
+    Action = delete прибирає їх. Ущільнений знімок записується у фоні"""
+    if not is_admin(update):
+        return
+    document = update.message.document
+    file = await document.get_file()
+    data = bytes(await file.download_as_bytearray())
+    try:
+        batch = await asyncio.to_thread(read_delta_file, document.file_name or "", data)
+        with timed("delta"):
+            snapshot = await apply_catalogue_delta(batch)
+    except Exception as e:
+        await update.message.reply_text(f"⛔️ Не вдалося застосувати зміни: {e}\nПрацює версія {catalogue.version}")
+        return
+    compactor = context.application.bot_data.get("compactor")
+    if compactor is None or compactor.done():
+        context.application.bot_data["compactor"] = asyncio.create_task(compact_catalogue(DELTA_COMPACT_DELAY))
+    deleted = int(batch["Delete"].sum())
+    await update.message.reply_text(
+        f"✅ Зміни застосовано: {len(batch) - deleted} рядків додано чи замінено, {deleted} на видалення"
+        f" (версія {snapshot.version}, {snapshot.filled_rows} шт.)\nЗнімок бази на диску оновиться у фоні"
+    )
+
+def cache_stats() -> dict:
+    return {"search": SEARCH_CACHE, "page": PAGE_CACHE, "inline": INLINE_CACHE}
+
+@instrumented
+async def perf_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обробник команди /perf — гістограми затримок і пам'ять (тільки для адміністраторів)"""
+    if not is_admin(update):
+        return
+    snapshot = catalogue
+    memory = snapshot.footprint()
+    ms = lambda seconds: f"{seconds * 1000:.2f}"
+    msg = "⏱ Затримки, мс (n / сер. / p50 / p90 / p99):\n"
+    for kind, title in (("handler", "Обробники"), ("phase", "Фази")):
+        msg += f"\n{title}:\n"
+        for name, h in sorted(PERF[kind].items()):
+            msg += (f"   • {name}: {h.count} / {ms(h.total / h.count)} / {ms(h.quantile(0.5))}"
+                    f" / {ms(h.quantile(0.9))} / {ms(h.quantile(0.99))}\n")
+    msg += (
+        f"\n📦 База: {len(snapshot)} рядків, версія {snapshot.version}\n"
+        f"   • Таблиця: {memory['table'] / 2**20:.1f} МБ (DataFrame: {snapshot.table.source_nbytes / 2**20:.1f} МБ,"
+        f" у {snapshot.table.source_nbytes / max(memory['table'], 1):.1f} раза більше)\n"
+        f"   • Індекси: {memory['index'] / 2**20:.1f} МБ\n"
+        f"   • Картки: {memory['cards'] / 2**20:.1f} МБ\n"
+        f"   • Зміни поверх знімка: {len(snapshot.delta.table) if snapshot.delta else 0} рядків,"
+        f" приховано {len(snapshot.delta.dead) if snapshot.delta else 0}\n"
+        f"   • Не прочитано книг чи аркушів: {len(snapshot.errors)}\n"
+        "\n"
+        f"🗄 Кеші (влучання, записів):\n"
+    )
+    for name, cache in cache_stats().items():
+        msg += f"   • {name}: {cache.hit_rate():.0%}, {len(cache.data)}\n"
+    scheduler = context.bot.rate_limiter
+    if isinstance(scheduler, SendScheduler):
+        msg += f"\n📤 Черга надсилання: {len(scheduler.waiting)}, повторів після 429: {scheduler.retried}\n"
+    await update.message.reply_text(msg)
+
+def metrics_text(app: Application) -> str:
+    """Метрики у текстовому форматі Prometheus"""
+    lines = []
+    for kind in ("handler", "phase"):
+        metric = f"codivag_{kind}_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        for name, h in sorted(PERF[kind].items()):
+            cumulative = 0
+            for bound, count in zip(h.buckets, h.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{{kind}="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{{kind}="{name}",le="+Inf"}} {h.count}')
+            lines.append(f'{metric}_sum{{{kind}="{name}"}} {h.total}')
+            lines.append(f'{metric}_count{{{kind}="{name}"}} {h.count}')
+    for field in ("hits", "misses"):
+        lines.append(f"# TYPE codivag_cache_{field}_total counter")
+        for name, cache in cache_stats().items():
+            lines.append(f'codivag_cache_{field}_total{{cache="{name}"}} {getattr(cache, field)}')
+    snapshot = catalogue
+    memory = snapshot.footprint()
+    lines += [
+        "# TYPE codivag_catalogue_rows gauge", f"codivag_catalogue_rows {len(snapshot)}",
+        "# TYPE codivag_catalogue_version gauge", f"codivag_catalogue_version {snapshot.version}",
+        "# TYPE codivag_memory_bytes gauge",
+    ]
+    lines += [f'codivag_memory_bytes{{part="{part}"}} {size}' for part, size in memory.items()]
+    lines += ["# TYPE codivag_source_dataframe_bytes gauge", f"codivag_source_dataframe_bytes {snapshot.table.source_nbytes}"]
+    scheduler = app.bot.rate_limiter
+    if isinstance(scheduler, SendScheduler):
+        lines += [
+            "# TYPE codivag_send_queue gauge", f"codivag_send_queue {len(scheduler.waiting)}",
+            "# TYPE codivag_send_retries_total counter", f"codivag_send_retries_total {scheduler.retried}",
+        ]
+    return "\n".join(lines) + "\n"
+
+async def serve_metrics(app: Application, port: int):
+    """Окремий HTTP-сервер лише для GET /metrics"""
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            line = await asyncio.wait_for(reader.readline(), 10)
+            while (await asyncio.wait_for(reader.readline(), 10)) not in (b"\r\n", b"\n", b""):
+                pass
+            if line.split()[:2] == [b"GET", b"/metrics"]:
+                body = metrics_text(app).encode()
+                head = "HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4"
+            else:
+                body = b""
+                head = "HTTP/1.1 404 Not Found"
+            writer.write(f"{head}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+    return await asyncio.start_server(handle, "0.0.0.0", port)
+
+# Найбільше артикулів в одному масовому запиті
+BULK_MAX_KEYS = int(os.getenv("BULK_MAX_KEYS", "10000"))
+# Розширення файлів, які приймаються для масового пошуку
+BULK_EXTENSIONS = ("xlsx", "csv", "txt")
+# Колонки аркуша знайдених артикулів
+BULK_COLUMNS = ("Article", "Version", "Dataset", "Model", "Year", "Region", "Unit")
+
+def bulk_keys(lines: list) -> list:
+    """Введені артикули без порожніх і повторів (за нормалізованим ключем), у порядку введення"""
+    seen = set()
+    result = []
+    for line in lines:
+        text = str(line).strip()
+        key = normalize_article(text)
+        if key and key not in seen:
+            seen.add(key)
+            result.append((text, key))
+    return result
+
+def read_csv_bytes(data: bytes, header) -> pd.DataFrame:
+    text = data.decode("utf-8-sig", errors="replace")
+    try:
+        # Лише звичні роздільники: автовизначення pandas може обрати цифру з артикула
+        sep = csv.Sniffer().sniff(text[:4096], delimiters=",;\t").delimiter
+    except csv.Error:
+        sep = ","
+    return pd.read_csv(io.StringIO(text), header=header, dtype=str, sep=sep, skip_blank_lines=True)
+
+def read_bulk_file(name: str, data: bytes) -> list:
+    """Артикули з файлу: колонка Article, якщо є такий заголовок, інакше перша колонка.
+    txt — по одному артикулу в рядку"""
+    extension = name.rsplit(".", 1)[-1].lower()
+    if extension == "txt":
+        return data.decode("utf-8", errors="replace").splitlines()
+    if extension == "xlsx":
+        frame = pd.read_excel(io.BytesIO(data), header=None, dtype=str)
+    else:
+        frame = read_csv_bytes(data, header=None)
+    if frame.empty:
+        return []
+    header = [str(value).strip().lower() for value in frame.iloc[0]]
+    if "article" in header:
+        return frame.iloc[1:, header.index("article")].dropna().tolist()
+    return frame.iloc[:, 0].dropna().tolist()
+
+def bulk_lookup(snapshot: Catalogue, keys: list) -> tuple:
+    """Хеш-з'єднання введених ключів із нормалізованими артикулами бази.
+    Повертає (номери введених артикулів, рядки бази) для збігів і номери промахів"""
+    queries = pd.DataFrame({"ArticleKey": [key for _, key in keys], "query": np.arange(len(keys))})
+    keys_column, rows = snapshot.article_keys()
+    catalogue_keys = pd.DataFrame({"ArticleKey": keys_column, "row": rows})
+    joined = queries.merge(catalogue_keys, on="ArticleKey", how="inner", sort=False)
+    joined = joined.sort_values(["query", "row"], kind="stable")
+    found = joined["query"].to_numpy()
+    missed = np.setdiff1d(np.arange(len(keys)), found)
+    return found, joined["row"].to_numpy(dtype=np.int64), missed
+
+def build_bulk_workbook(snapshot: Catalogue, keys: list) -> tuple:
+    """Пише xlsx із двома аркушами: знайдені рядки бази та ненайдені артикули.
+    Повертає (тимчасовий файл, кількість знайдених артикулів)"""
+    with timed("bulk_join"):
+        found, rows, missed = bulk_lookup(snapshot, keys)
+    columns = [snapshot.take(col, rows) for col in BULK_COLUMNS]
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Знайдено")
+    ws.append(["Query", *BULK_COLUMNS])
+    for i, values in enumerate(zip(*columns)):
+        ws.append([keys[found[i]][0], *values])
+    ws = wb.create_sheet("Не знайдено")
+    ws.append(["Query"])
+    for i in missed.tolist():
+        ws.append([keys[i][0]])
+    f = tempfile.TemporaryFile()
+    wb.save(f)
+    f.seek(0)
+    return f, len(keys) - len(missed)
+
+async def send_bulk_results(message, context: ContextTypes.DEFAULT_TYPE, lines: list, lang: str):
+    """Масовий пошук: один файл зі збігами й промахами замість окремого пошуку на кожен артикул"""
+    keys = bulk_keys(lines)
+    if not keys:
+        await message.reply_text(LANGUAGES[lang]["bulk_empty"], reply_markup=back_to_menu_keyboard(lang))
+        return
+    if len(keys) > BULK_MAX_KEYS:
+        await message.reply_text(LANGUAGES[lang]["bulk_too_many"].format(limit=BULK_MAX_KEYS),
+                                 reply_markup=back_to_menu_keyboard(lang))
+        return
+    snapshot = catalogue
+    with timed("bulk"):
+        excel_file, found = await asyncio.to_thread(build_bulk_workbook, snapshot, keys)
+    try:
+        await context.bot.send_document(
+            chat_id=message.chat_id,
+            document=excel_file,
+            filename="bulk_search.xlsx",
+            caption=LANGUAGES[lang]["bulk_ok"].format(found=found, total=len(keys)),
+            reply_markup=back_to_menu_keyboard(lang),
+            rate_limit_args={"priority": PRIORITY_BULK},
+        )
+    finally:
+        excel_file.close()
+
+@instrumented
+async def bulk_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обробник надісланого файлу (xlsx, csv, txt) зі списком артикулів"""
+    lang = get_lang(context)
+    document = update.message.document
+    file = await document.get_file()
+    data = bytes(await file.download_as_bytearray())
+    try:
+        lines = await asyncio.to_thread(read_bulk_file, document.file_name or "", data)
+    except Exception:
+        logger.warning("Could not read bulk lookup file %s", document.file_name, exc_info=True)
+        lines = []
+    await send_bulk_results(update.message, context, lines, lang)
+
+# Рядків на аркуш Excel (ліміт формату мінус заголовок)
+EXCEL_MAX_ROWS = 1048575
+# Одночасно готується не більше одного експорту
+export_lock = asyncio.Lock()
+
+def build_export(success: bool, title: str, since: float = None, until: float = None):
+    """Пише журнал у xlsx у режимі write-only (рядки не тримаються в пам'яті).
+    Повертає (тимчасовий файл, кількість рядків) або (None, 0)"""
+    headers = ["query", "lang", "timestamp", "results_count"] if success else ["query", "lang", "timestamp"]
+    wb = openpyxl.Workbook(write_only=True)
+    ws = None
+    count = 0
+    for ts, text, lang, results_count in QUERY_LOG.iter_rows(success, since, until):
+        if count % EXCEL_MAX_ROWS == 0:
+            sheet = count // EXCEL_MAX_ROWS
+            ws = wb.create_sheet(title if not sheet else f"{title} {sheet + 1}")
+            ws.append(headers)
+        row = [text, lang, datetime.datetime.fromtimestamp(ts)]
+        if success:
+            row.append(results_count)
+        ws.append(row)
+        count += 1
+    if not count:
+        return None, 0
+    f = tempfile.TemporaryFile()
+    wb.save(f)
+    f.seek(0)
+    return f, count
+
+def parse_date(value: str) -> float:
+    return datetime.datetime.strptime(value, "%d.%m.%Y").timestamp()
+
+@instrumented
+async def export_data(update: Update, context: ContextTypes.DEFAULT_TYPE, data_type: str,
+                      since: float = None, until: float = None):
+    """Експорт даних у Excel (у фоновому потоці, бот тим часом відповідає іншим)"""
+    message = update.effective_message
     
     lang = get_lang(context)
     
     if data_type == "success":
-        data = STATS["success_queries"]
         filename = "successful_queries"
         title = "Успішні запити"
     else:
-        data = STATS["fail_queries"]
         filename = "failed_queries"
         title = "Неуспішні запити"
     
-    if not data:
-        await query.message.reply_text(f"⚠️ Немає даних для {title.lower()}", reply_markup=back_to_menu_keyboard(lang))
+    async with export_lock:
+        await QUERY_LOG.flush()
+        excel_file, count = await asyncio.to_thread(build_export, data_type == "success", title, since, until)
+    if excel_file is None:
+        await message.reply_text(f"⚠️ Немає даних для {title.lower()}", reply_markup=back_to_menu_keyboard(lang))
         return
     
-    # Створення DataFrame
-    df_export = pd.DataFrame(data)
-    
-    # Експорт у Excel
-    excel_buffer = io.BytesIO()
-    with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-        df_export.to_excel(writer, index=False, sheet_name=title)
-    excel_buffer.seek(0)
-    
-    await context.bot.send_document(
-        chat_id=query.message.chat_id,
-        document=excel_buffer,
-        filename=f"{filename}.xlsx",
-        caption=f"📈 {title} (Excel)",
-        reply_markup=back_to_menu_keyboard(lang)
-    )
+    try:
+        await context.bot.send_document(
+            chat_id=message.chat_id,
+            document=excel_file,
+            filename=f"{filename}.xlsx",
+            caption=f"📈 {title} (Excel, {count} шт.)",
+            reply_markup=back_to_menu_keyboard(lang),
+            rate_limit_args={"priority": PRIORITY_BULK},
+        )
+    finally:
+        excel_file.close()
+
+@instrumented
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обробник команди /export success|fail [з ДД.ММ.РРРР] [по ДД.ММ.РРРР]"""
+    args = context.args or []
+    usage = "ℹ️ /export success|fail [з ДД.ММ.РРРР] [по ДД.ММ.РРРР]"
+    if not args or args[0] not in ("success", "fail") or len(args) > 3:
+        await update.message.reply_text(usage)
+        return
+    try:
+        since = parse_date(args[1]) if len(args) > 1 else None
+        # Кінцева дата включно — до початку наступного дня
+        until = parse_date(args[2]) + 86400 if len(args) > 2 else None
+    except ValueError:
+        await update.message.reply_text(usage)
+        return
+    await export_data(update, context, args[0], since, until)
 
+@instrumented
 async def button(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     lang = get_lang(context)
     await query.answer()
     data = query.data
 
-    if data.startswith("res_"):
-        page = int(data.split("_")[1])
-        results = context.user_data.get("search_results")
-        if results is not None and not results.empty:
-            context.user_data["page"] = page
-            page_text = render_page(results, page, lang)
-            await query.message.edit_text(
-                page_text,
-                reply_markup=results_nav_keyboard(lang, page, len(results))
-            )
+    # Кнопки результатів: увесь стан (запит, фільтри, сторінка) — у підписаному токені
+    if data.startswith("~"):
+        state = parse_results_token(data)
+        if state is None:
+            # Підпис іншим ключем або пошкоджений токен
+            return
+        view, field, page, fingerprint, filters, text = state
+        text = token_text(text)
+        if not text:
+            # Запит за хешем забуто — показувати результати іншого запиту не можна
+            await query.message.reply_text(LANGUAGES[lang]["results_expired"])
+            return
+        snapshot = catalogue
+        if fingerprint != snapshot.fingerprint:
+            # Дані змінились — коди фільтрів належать старій базі, тож результати показуються без них
+            view, filters = "p", ()
+        # Фільтри і сторінки за межами SEARCH_LIMIT потребують усіх збігів — вони рахуються лише тепер
+        limit = SEARCH_LIMIT if view == "p" and not filters and (page + 1) * 5 <= SEARCH_LIMIT else None
+        with timed("search"):
+            key, rows = await run_search(snapshot, text, limit)
+        with timed("refine"):
+            rows = apply_filters(snapshot, rows, filters)
+        if not len(rows):
+            return
+        page = min(page, (len(rows) - 1) // 5)
+        text = token_query(key[1])
+        if view == "p":
+            with timed("render"):
+                page_text = filtered_page(snapshot, rows, key, filters, page, lang)
+            with timed("send"):
+                await query.message.edit_text(
+                    page_text,
+                    reply_markup=results_nav_keyboard(lang, snapshot, text, filters, page, len(rows),
+                                                      more=truncated(key))
+                )
+        else:
+            if view == "f":
+                markup = facets_keyboard(lang, snapshot, text, filters, rows, page)
+            else:
+                markup = facet_values_keyboard(lang, snapshot, text, filters, rows, page, field)
+            with timed("send"):
+                await query.message.edit_reply_markup(reply_markup=markup)
         return
 
+    # Підказка "можливо, ви мали на увазі"
+    elif data.startswith("find_"):
+        await send_search_results(query.message, context, data[len("find_"):], lang)
+
     # Обробка експорту даних
     elif data == "export_success_excel":
         await export_data(update, context, "success")
@@ -747,15 +3194,210 @@ async def button(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif data == "menu":
         await query.message.reply_text(LANGUAGES[lang]["back_menu"], reply_markup=main_menu_keyboard(lang))
 
+class UpdateQueue(asyncio.Queue):
+    """Черга оновлень Application, що знає, скільки прийнятих оновлень ще не оброблено"""
+
+    def __init__(self):
+        super().__init__()
+        self.unfinished = 0
+
+    def put_nowait(self, item):
+        super().put_nowait(item)
+        self.unfinished += 1
+
+    def task_done(self):
+        super().task_done()
+        self.unfinished -= 1
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found",
+                413: "Payload Too Large", 503: "Service Unavailable"}
+
+class WebhookServer:
+    """Мінімальний HTTP/1.1 сервер на asyncio, що приймає оновлення вебхука Telegram"""
+
+    max_body = 1 << 20
+    idle_timeout = 75
+
+    def __init__(self, app: Application, host: str, port: int, path: str, secret: str, limit: int):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret = secret
+        self.limit = limit
+        self.server = None
+        self.accepting = False
+        self.connections = set()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.accepting = True
+
+    async def stop(self, timeout: float):
+        """Перестає приймати запити і чекає, поки прийняті оновлення буде оброблено"""
+        self.accepting = False
+        self.server.close()
+        for writer in list(self.connections):
+            writer.close()
+        await self.server.wait_closed()
+        try:
+            await asyncio.wait_for(self.app.update_queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("%s updates were not processed before shutdown", self.app.update_queue.unfinished)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections.add(writer)
+        try:
+            while self.accepting:
+                try:
+                    status, keep_alive = await asyncio.wait_for(self.read_request(reader), self.idle_timeout)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if status is None:
+                    break
+                writer.write(
+                    f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+                    f"Content-Length: 0\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode()
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+
+    async def read_request(self, reader: asyncio.StreamReader):
+        """Читає один запит; повертає (HTTP-статус, чи тримати з'єднання) або (None, False)"""
+        line = await reader.readline()
+        if not line:
+            return None, False
+        try:
+            method, target, version = line.decode("latin-1").split()
+        except ValueError:
+            return 400, False
+        headers = {}
+        while True:
+            header = await reader.readline()
+            if header in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = header.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            return 400, False
+        if length > self.max_body:
+            return 413, False
+        body = await reader.readexactly(length)
+
+        if method != "POST" or target.split("?", 1)[0] != self.path:
+            return 404, keep_alive
+        if self.secret and not hmac.compare_digest(
+            headers.get("x-telegram-bot-api-secret-token", "").encode(), self.secret.encode()
+        ):
+            return 403, keep_alive
+        queue = self.app.update_queue
+        if not self.accepting or queue.unfinished >= self.limit:
+            return 503, keep_alive
+        try:
+            update = Update.de_json(json.loads(body), self.app.bot)
+        except ValueError:
+            return 400, keep_alive
+        if update is None:
+            return 400, keep_alive
+        queue.put_nowait(update)
+        return 200, keep_alive
+
+async def serve_webhook(app: Application):
+    """Життєвий цикл бота в режимі вебхука, аналог run_polling"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    server = WebhookServer(app, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_QUEUE)
+    await app.initialize()
+    try:
+        if app.post_init:
+            await app.post_init(app)
+        await server.start()
+        if WEBHOOK_URL:
+            await app.bot.set_webhook(
+                url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=Update.ALL_TYPES,
+            )
+        await app.start()
+        logger.info("Webhook server listening on %s:%s%s", WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH)
+        await stop.wait()
+    finally:
+        if server.server is not None:
+            await server.stop(WEBHOOK_DRAIN_TIMEOUT)
+        if app.running:
+            await app.stop()
+        await app.shutdown()
+        if app.post_shutdown:
+            await app.post_shutdown(app)
+
+async def post_init(app: Application):
+    start_executor()
+    await asyncio.to_thread(catalogue.warm_up)
+    if RELOAD_INTERVAL > 0:
+        app.bot_data["watcher"] = asyncio.create_task(watch_catalogue(RELOAD_INTERVAL))
+    app.bot_data["query_log"] = asyncio.create_task(flush_query_log(QUERY_LOG_FLUSH))
+    if METRICS_PORT:
+        app.bot_data["metrics"] = await serve_metrics(app, METRICS_PORT)
+
+async def post_shutdown(app: Application):
+    metrics = app.bot_data.pop("metrics", None)
+    if metrics is not None:
+        metrics.close()
+    for name in ("watcher", "query_log", "compactor"):
+        task = app.bot_data.pop(name, None)
+        if task is not None:
+            task.cancel()
+    await QUERY_LOG.flush()
+    QUERY_LOG.close()
+    stop_executor()
+
 def main():
     if not TOKEN:
         raise RuntimeError("BOT_TOKEN is not set")
-    app = Application.builder().token(TOKEN).build()
+    if BOT_MODE == "webhook" and not WEBHOOK_SECRET:
+        # Без секрету будь-хто, хто знає адресу, може надсилати боту підроблені оновлення
+        raise RuntimeError("WEBHOOK_SECRET is not set; webhook mode refuses to accept unauthenticated updates")
+    builder = Application.builder().token(TOKEN).post_init(post_init).post_shutdown(post_shutdown)
+    builder = builder.rate_limiter(SendScheduler(SEND_RATE, SEND_CHAT_RATE, SEND_GROUP_RATE, SEND_BURST, SEND_RETRIES))
+    if BOT_API_URL:
+        builder = builder.base_url(f"{BOT_API_URL.rstrip('/')}/bot").base_file_url(f"{BOT_API_URL.rstrip('/')}/file/bot")
+    if BOT_MODE == "webhook":
+        # Оновлення приходять через вбудований сервер, а не через Updater
+        builder = builder.updater(None).update_queue(UpdateQueue())
+    if MAX_IN_FLIGHT > 1:
+        builder = builder.concurrent_updates(ChatOrderedUpdateProcessor(MAX_IN_FLIGHT))
+    load_catalogue()
+    app = builder.build()
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("stats", stats_command))  # Додано команду /stats
+    app.add_handler(CommandHandler("reload", reload_command))
+    app.add_handler(CommandHandler("export", export_command))
+    app.add_handler(CommandHandler("perf", perf_command))
     app.add_handler(CallbackQueryHandler(button))
+    app.add_handler(InlineQueryHandler(inline_search))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, search_database))
-    app.run_polling()
+    bulk_files = filters.Document.FileExtension(BULK_EXTENSIONS[0])
+    for extension in BULK_EXTENSIONS[1:]:
+        bulk_files |= filters.Document.FileExtension(extension)
+    # Файл змін від адміністратора перехоплюється раніше за масовий пошук
+    app.add_handler(MessageHandler(filters.Document.ALL & filters.CaptionRegex(r"^/delta\b"), delta_command))
+    app.add_handler(MessageHandler(bulk_files, bulk_document))
+    if BOT_MODE == "webhook":
+        asyncio.run(serve_webhook(app))
+    else:
+        app.run_polling()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,92 @@
+"""Читання аркушів бази: нормалізація артикулів і заголовків, розбір xlsx у процесах пулу.
+
+Модуль окремий від bot.py, щоб процеси пулу читання імпортували лише pandas і openpyxl,
+а не весь бот, і щоб передача read_sheet у процес не чекала на імпорт bot.
+"""
+import re
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+# Кириличні літери, які користувачі вводять замість схожих латинських.
+# Літери O в артикулах VAG немає, тому і латинська, і кирилична O стають нулем
+HOMOGLYPHS = str.maketrans("АВСЕНІЇКМОРТХУЅЈO", "ABCEHIIKM0PTXYSJ0")
+
+# Все, що не літера і не цифра, вважаємо роздільником ("5Q0 907 530", "5q0-907-530")
+ARTICLE_SEPARATORS = re.compile(r"[\W_]+")
+
+# Колонки бази після load_dataframe, які зберігає CompactTable
+FRAME_COLUMNS = ("Article", "Version", "Dataset", "Model", "Year", "Region", "Unit", "ArticleKey")
+
+def normalize_article(value) -> str:
+    """Ключ артикула: без роздільників, у верхньому регістрі, кирилиця -> латиниця"""
+    if not isinstance(value, str):
+        return ""
+    return ARTICLE_SEPARATORS.sub("", value.upper().translate(HOMOGLYPHS))
+
+def prepare_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Приводить аркуш до вигляду бази: усі колонки на місці, рядки, ключ артикула"""
+    for col in ["Article", "Version", "Dataset", "Model", "Year", "Region", "Unit"]:
+        if col not in df.columns:
+            df[col] = ""
+    try:
+        df["Year"] = df["Year"].apply(lambda x: int(x) if pd.notna(x) and str(x).strip() != "" else "")
+    except Exception:
+        pass
+    for col in ["Article", "Version", "Dataset", "Model", "Region", "Unit"]:
+        try:
+            df[col] = df[col].astype(str)
+        except Exception:
+            pass
+    df["ArticleKey"] = df["Article"].map(normalize_article)
+    return df
+
+# Як можуть називатися колонки бази в книгах різних марок (після header_key)
+HEADER_ALIASES = {
+    "Article": ("article", "articlenumber", "artikel", "artikelnummer", "teilenummer", "partnumber", "partno",
+                "артикул"),
+    "Version": ("version", "swversion", "softwareversion", "версія", "версия"),
+    "Dataset": ("dataset", "datensatz", "parameterset", "датасет"),
+    "Model": ("model", "modell", "vehicle", "fahrzeug", "модель"),
+    "Year": ("year", "modelyear", "baujahr", "jahr", "рік", "год"),
+    "Region": ("region", "market", "markt", "регіон", "регион"),
+    "Unit": ("unit", "ecu", "steuergerät", "steuergerat", "block", "блок"),
+}
+HEADER_SCHEMA = {alias: col for col, aliases in HEADER_ALIASES.items() for alias in aliases}
+
+def header_key(value) -> str:
+    # "Part No." -> "partno", "SW-Version" -> "swversion"
+    return ARTICLE_SEPARATORS.sub("", str(value).lower())
+
+def schema_columns(headers) -> dict:
+    """Заголовки аркуша -> колонки бази; з кількох кандидатів на одну колонку береться перший"""
+    mapping = {}
+    for header in headers:
+        col = HEADER_SCHEMA.get(header_key(header)) if header is not None else None
+        if col is not None and col not in mapping.values():
+            mapping[header] = col
+    return mapping
+
+def read_sheet(book: str, sheet: str) -> pd.DataFrame:
+    """Аркуш книги в колонках бази, готовий до злиття; виконується в процесах пулу читання"""
+    df = pd.read_excel(book, sheet_name=sheet)
+    df = df.rename(columns=schema_columns(df.columns))
+    return prepare_frame(df.loc[:, ~df.columns.duplicated()])[list(FRAME_COLUMNS)]
+
+def read_sheets(jobs: list, workers: int) -> list:
+    """read_sheet для кожного (книга, аркуш) по порядку; на місці аркуша, що не прочитався, — виняток.
+    Кілька аркушів читаються паралельно в workers процесах (розбір xlsx упирається в GIL)"""
+    workers = min(workers, len(jobs))
+    # Процеси WorkerPool (daemon) не можуть мати власних дочірніх процесів
+    if workers <= 1 or multiprocessing.current_process().daemon:
+        results = []
+        for job in jobs:
+            try:
+                results.append(read_sheet(*job))
+            except Exception as e:
+                results.append(e)
+        return results
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(read_sheet, *job) for job in jobs]
+        return [future.exception() or future.result() for future in futures]
@@ -0,0 +1,118 @@
+"""Пошук із обмеженням видачі поверх знімка зі змінами (Delta)."""
+import numpy as np
+import pandas as pd
+
+import bot
+
+
+def make_catalogue(rows: int) -> bot.Catalogue:
+    frame = bot.prepare_frame(pd.DataFrame({
+        "Article": [f"1K0907{i:03d}" for i in range(rows)],
+        "Version": [f"{i:04d}" for i in range(rows)],
+        "Dataset": [f"5Q0909{i:03d}" for i in range(rows)],
+        "Model": ["Golf7"] * rows,
+        "Year": [2015] * rows,
+        "Region": ["EU"] * rows,
+        "Unit": ["01"] * rows,
+    }))[list(bot.FRAME_COLUMNS)]
+    table = bot.CompactTable(frame)
+    return bot.Catalogue("test.xlsx", table, bot.build_search_index(frame, table), None, 1)
+
+
+def delete_batch(snapshot: bot.Catalogue, rows: list) -> pd.DataFrame:
+    batch = snapshot.table.frame(np.array(rows))
+    batch["Delete"] = True
+    return batch
+
+
+def test_capped_search_skips_deleted_rows():
+    snapshot = make_catalogue(50)
+    snapshot = bot.apply_delta(snapshot, delete_batch(snapshot, [0, 1, 2]))
+    full = snapshot.search("1K0907")
+    assert len(full) == 47
+    capped = snapshot.search("1K0907", 10)
+    assert capped.tolist() == full[:10].tolist()
+
+
+def test_row_ids_stay_int32():
+    snapshot = make_catalogue(50)
+    for query in ("1K0907", "1K0907001", "1k", "1K0.90"):
+        assert bot.find_rows(snapshot, query)[1].dtype == np.int32, query
+        assert bot.find_rows(snapshot, query, None)[1].dtype == np.int32, query
+    snapshot = bot.apply_delta(snapshot, delete_batch(snapshot, [0, 1]))
+    assert snapshot.search("1K0907").dtype == np.int32
+    assert snapshot.search("1K0907", 10).dtype == np.int32
+    assert snapshot.top(bot.normalize_article("1K0"), 5).dtype == np.int32
+
+
+def test_truncation_uses_extra_row():
+    snapshot = make_catalogue(20)
+    key, rows = bot.find_rows(snapshot, "1K0907", 20)
+    assert len(rows) == 20 and not bot.truncated(key)
+    key, rows = bot.find_rows(snapshot, "1K0907", 19)
+    assert len(rows) == 19 and bot.truncated(key)
+    snapshot = bot.apply_delta(snapshot, delete_batch(snapshot, [0]))
+    key, rows = bot.find_rows(snapshot, "1K0907", 19)
+    assert len(rows) == 19 and not bot.truncated(key)
+
+
+def test_non_ascii_query_uses_index():
+    values = ["3Q0907530С", "Блок ABS Golf", "блок двигуна", "Kodiaq", "İSTANBUL", "ÄÖÜ 907"]
+    column = bot.StringColumn(values)
+    index = bot.TrigramIndex(column)
+    assert index.unindexed.tolist() == [4]
+    for query in ("блок", "БЛОК", "530с", "äöü", "стан", "abs"):
+        expected = [pos for pos, value in enumerate(values) if query.lower() in value.lower()]
+        assert index.search(query, column).tolist() == expected, query
+
+
+def test_full_scan_matches_str_contains():
+    values = ["1K0907530A", "", "5Q0 909 144", "Блок ABS", "İSTANBUL", "ab", "1k0-907"] * 40
+    # Перенос у значенні вимикає пошук по всій колонці одним рядком — перевіряємо обидва шляхи
+    for values in (values, values + ["a\nb"]):
+        column = bot.StringColumn(values)
+        index = bot.TrigramIndex(column)
+        series = pd.Series([value or None for value in values], dtype=object)
+        for query in ("1k", "б", "İ", "", "9 ", "a.b", "^1k", "\\d{3}[a-z]$", "[^a]9", "b$", "x*", "(?<=a)b"):
+            expected = np.flatnonzero(series.str.contains(query, case=False, na=False).to_numpy(dtype=bool)).tolist()
+            if bot.REGEX_SPECIAL.search(query):
+                found = bot.regex_rows(column, query)
+                capped = bot.regex_rows(column, query, 5)
+            else:
+                found = index.scan(query, column)
+                capped = index.scan(query, column, 5)
+            assert found.tolist() == expected, query
+            assert capped.tolist() == expected[:5], query
+
+
+def frame_of(articles: list, year: int = 2015) -> pd.DataFrame:
+    rows = len(articles)
+    return bot.prepare_frame(pd.DataFrame({
+        "Article": articles,
+        "Version": ["0001"] * rows,
+        "Dataset": ["5Q0909144"] * rows,
+        "Model": ["Golf7"] * rows,
+        "Year": [year] * rows,
+        "Region": ["EU"] * rows,
+        "Unit": ["01"] * rows,
+    }))[list(bot.FRAME_COLUMNS)]
+
+
+def test_top_merges_delta_by_rank():
+    base = frame_of(["5Q0907530XYZ", "5Q0035456", "5Q0907357", "5Q0907530AB", "5Q0909144C", "1K0907530"])
+    table = bot.CompactTable(base)
+    snapshot = bot.Catalogue("test.xlsx", table, bot.build_search_index(base, table), None, 1)
+    batch = frame_of(["5Q0907530XYZQ", "5Q0907358"], 2020)
+    batch["Delete"] = False
+    deleted = snapshot.table.frame(np.array([2]))
+    deleted["Delete"] = True
+    snapshot = bot.apply_delta(snapshot, pd.concat([batch, deleted], ignore_index=True))
+    key = bot.normalize_article("5Q0")
+    # Та сама база після ущільнення — одна таблиця й один індекс
+    merged = pd.concat([base.drop(index=2), batch[list(bot.FRAME_COLUMNS)]], ignore_index=True)
+    table = bot.CompactTable(merged)
+    compacted = bot.Catalogue("test.xlsx", table, bot.build_search_index(merged, table), None, 1)
+    for limit in (1, 3, 5, 10):
+        expected = compacted.take("ArticleKey", compacted.top(key, limit))
+        assert snapshot.take("ArticleKey", snapshot.top(key, limit)) == expected, limit
+    assert snapshot.take("ArticleKey", snapshot.top(key, 5))[:2] == ["5Q0907358", "5Q0035456"]
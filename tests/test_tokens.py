@@ -0,0 +1,139 @@
+"""Підписані токени кнопок результатів: підпис, довгі запити за хешем, зміна бази."""
+import asyncio
+import itertools
+import types
+
+import pandas as pd
+
+import bot
+
+# Кеші пошуку й сторінок ключуються версією бази, тож кожна тестова база — зі своєю
+VERSIONS = itertools.count(1)
+
+
+def make_catalogue(models: list) -> bot.Catalogue:
+    rows = len(models)
+    frame = bot.prepare_frame(pd.DataFrame({
+        "Article": [f"1K0907{i:03d}" for i in range(rows)],
+        "Version": [f"{i:04d}" for i in range(rows)],
+        "Dataset": ["5Q0909144"] * rows,
+        "Model": models,
+        "Year": [2015] * rows,
+        "Region": ["EU"] * rows,
+        "Unit": ["01"] * rows,
+    }))[list(bot.FRAME_COLUMNS)]
+    table = bot.CompactTable(frame)
+    return bot.Catalogue("test.xlsx", table, bot.build_search_index(frame, table), None, next(VERSIONS))
+
+
+class FakeMessage:
+    def __init__(self):
+        self.edits = []
+        self.replies = []
+
+    async def edit_text(self, text, reply_markup=None, **kwargs):
+        self.edits.append((text, reply_markup))
+
+    async def edit_reply_markup(self, reply_markup=None, **kwargs):
+        self.edits.append((None, reply_markup))
+
+    async def reply_text(self, text, reply_markup=None, **kwargs):
+        self.replies.append(text)
+
+
+class FakeCallbackQuery:
+    def __init__(self, data: str):
+        self.data = data
+        self.message = FakeMessage()
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+
+def press(data: str) -> FakeMessage:
+    query = FakeCallbackQuery(data)
+    update = types.SimpleNamespace(callback_query=query, effective_user=types.SimpleNamespace(id=1),
+                                   effective_chat=types.SimpleNamespace(id=1))
+    asyncio.run(bot.button(update, types.SimpleNamespace(user_data={})))
+    return query.message
+
+
+def keyboard_states(markup) -> list:
+    return [bot.parse_results_token(button.callback_data) for row in markup.inline_keyboard for button in row
+            if button.callback_data.startswith("~")]
+
+
+def test_token_round_trip():
+    snapshot = make_catalogue(["Golf7", "Passat"] * 10)
+    filters = ((0, 1), (3, 0x2a))
+    for view, field in (("p", None), ("f", None), ("c2", 2)):
+        token = bot.results_token(view, snapshot, "1K0 907", filters, 12)
+        assert bot.parse_results_token(token) == (view[0], field, 12, snapshot.fingerprint, filters, "1K0 907")
+
+
+def test_long_query_round_trip():
+    snapshot = make_catalogue(["Golf7"] * 3)
+    query = "блок керування двигуном 1K0907115"
+    text = bot.token_query(query)
+    assert text.startswith("#") and bot.token_query(query) == text
+    state = bot.parse_results_token(bot.results_token("p", snapshot, text, (), 0))
+    assert bot.token_text(state[5]) == query
+    # Запит, що сам починається з "#", теж іде за хешем, щоб не сплутати його з хешем
+    assert bot.token_query("#1K0").startswith("#") and bot.token_text(bot.token_query("#1K0")) == "#1K0"
+    bot.LONG_QUERIES.clear()
+    assert bot.token_text(text) is None
+
+
+def test_tampered_token_is_rejected():
+    snapshot = make_catalogue(["Golf7"] * 3)
+    token = bot.results_token("p", snapshot, "1K0907", ((0, 1),), 0)
+    size = len(bot.sign_token(""))
+    signature, payload = token[1:1 + size], token[1 + size:]
+    flipped = ("B" if signature[0] == "A" else "A") + signature[1:]
+    for data in ("~" + flipped + payload,
+                 "~" + signature + payload.replace("1K0907", "1K0908"),
+                 "~" + signature + payload.replace("-", "") + "-01",
+                 "~" + "Ї" * size + payload,
+                 "~" + signature,
+                 "~"):
+        assert bot.parse_results_token(data) is None, data
+
+
+def test_expired_long_query_is_not_replaced(monkeypatch):
+    monkeypatch.setattr(bot, "catalogue", make_catalogue(["Golf7"] * 12))
+    token = bot.results_token("p", bot.catalogue, bot.token_query("1K0907 " + "x" * 30), (), 1)
+    bot.LONG_QUERIES.clear()
+    message = press(token)
+    assert message.edits == [] and message.replies == [bot.LANGUAGES["uk"]["results_expired"]]
+
+
+def test_stale_fingerprint_drops_filters(monkeypatch):
+    old = make_catalogue(["Golf7", "Passat"] * 6)
+    passat = list(old.facets.values["Model"]).index("Passat")
+    token = bot.results_token("f", old, "1K0907", ((0, passat),), 0)
+    monkeypatch.setattr(bot, "catalogue", old)
+    message = press(token)
+    assert [text for text, _ in message.edits] == [None]
+    assert all(state[3] == old.fingerprint and state[4] == ((0, passat),)
+               for state in keyboard_states(message.edits[0][1]))
+
+    # Після перезавантаження бази коди фільтрів могли змінитись: показуємо першу сторінку без них
+    new = make_catalogue(["Polo", "Passat", "Golf7"] * 4)
+    assert new.fingerprint != old.fingerprint
+    monkeypatch.setattr(bot, "catalogue", new)
+    message = press(token)
+    assert len(message.edits) == 1 and message.edits[0][0]
+    states = keyboard_states(message.edits[0][1])
+    assert states and all(state[3] == new.fingerprint and state[4] == () for state in states)
+
+
+def test_worst_case_token_fits_callback_data():
+    snapshot = make_catalogue(["Golf7"] * 3)
+    filters = tuple((field, 0xffff) for field in range(len(bot.FACET_FIELDS)))
+    # Найдовший запит, що ще йде в токен як є, і довший, що йде за хешем
+    for query in ("ї" * (bot.TOKEN_QUERY_BYTES // 2), "блок керування двигуном " * 4):
+        text = bot.token_query(query)
+        for view in ("p", "f", "c3"):
+            token = bot.results_token(view, snapshot, text, filters, 200000)
+            assert len(token.encode()) <= 64, (view, query)
+            assert bot.parse_results_token(token)[4:] == (filters, text)